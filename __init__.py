@@ -1,7 +1,66 @@
+import os
+import importlib.util
 from flask import Flask
 
-def create_app():
+def create_app(config: dict | None = None):
+    # config overrides the defaults below, before any of them takes effect
     app = Flask(__name__)
+    app.config.update(config or {})
+
+    from .preprocessing import DEFAULT_CHUNK_SIZE, DEFAULT_MEMORY_BUDGET
+    app.config.setdefault('PUC_INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    app.config.setdefault('PUC_INGEST_MEMORY_BUDGET', DEFAULT_MEMORY_BUDGET)
+
+    # threads running the independent stages of one upload (and parsing the files of a
+    # multi-file upload), 1 to run them in turn
+    from .stages import set_stage_workers, DEFAULT_STAGE_WORKERS
+    app.config.setdefault('PUC_STAGE_WORKERS', DEFAULT_STAGE_WORKERS)
+    set_stage_workers(app.config['PUC_STAGE_WORKERS'])
+    # worker processes evaluating the rules of a long export in time shards, None for one per CPU;
+    # the pool starts with the first export long enough to shard and is kept from then on
+    from .sharding import set_rule_workers
+    app.config.setdefault('PUC_RULE_WORKERS', None)
+    set_rule_workers(app.config['PUC_RULE_WORKERS'])
+
+    # the issues workbook the summary reads, by default the one shipped with the package
+    from .summary import excel_path, set_issues_workbook
+    app.config.setdefault('PUC_ISSUES_WORKBOOK', excel_path)
+    set_issues_workbook(app.config['PUC_ISSUES_WORKBOOK'])
+
+    from .cache import AnalysisCache, DEFAULT_CACHE_MAX_BYTES
+    app.config.setdefault('PUC_CACHE_DIR', os.path.join(app.instance_path, 'puc_cache'))
+    app.config.setdefault('PUC_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+
+    # the cache stores Parquet, without pyarrow every upload is simply processed
+    if importlib.util.find_spec('pyarrow') is not None:
+        app.extensions['puc_cache'] = AnalysisCache(
+            app.config['PUC_CACHE_DIR'], app.config['PUC_CACHE_MAX_BYTES']
+        )
+
+    from .models import ModelRegistry, DEFAULT_BATCH_WINDOW, DEFAULT_MAX_BATCH_ROWS
+    app.config.setdefault('PUC_MODEL_DIR', os.path.join(app.instance_path, 'models'))
+    app.config.setdefault('PUC_PREDICT_BATCH_WINDOW', DEFAULT_BATCH_WINDOW)
+    app.config.setdefault('PUC_PREDICT_MAX_BATCH_ROWS', DEFAULT_MAX_BATCH_ROWS)
+    # threads scoring the chunks of one batch, None to score them in turn
+    app.config.setdefault('PUC_PREDICT_WORKERS', None)
+
+    # loaded here, before any worker is forked, so the memory-mapped models are shared
+    app.extensions['puc_models'] = ModelRegistry(
+        app.config['PUC_MODEL_DIR'],
+        app.config['PUC_PREDICT_BATCH_WINDOW'],
+        app.config['PUC_PREDICT_MAX_BATCH_ROWS'],
+        app.config['PUC_PREDICT_WORKERS'],
+    )
+
+    from .profiling import ProfileStore, DEFAULT_MAX_PROFILES
+    app.config.setdefault('PUC_PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    app.config.setdefault('PUC_PROFILE_MAX_FILES', DEFAULT_MAX_PROFILES)
+    # client addresses allowed to profile requests and read the profiles, empty to turn profiling off
+    app.config.setdefault('PUC_PROFILE_ALLOWED_ADDRS', ('127.0.0.1', '::1'))
+    if app.config['PUC_PROFILE_ALLOWED_ADDRS']:
+        app.extensions['puc_profiles'] = ProfileStore(
+            app.config['PUC_PROFILE_DIR'], app.config['PUC_PROFILE_MAX_FILES']
+        )
 
     from .routes import main
     app.register_blueprint(main)
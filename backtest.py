@@ -0,0 +1,225 @@
+# scores the rule engine (and optionally a model) on a corpus of PUC files with known root causes,
+# run with: python -m <package>.backtest CORPUS MANIFEST [--out report.json] [--model model.joblib]
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import contextlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+
+from .preprocessing import preprocess_puc_filepath
+from .pipeline import diagnose_package, summarise
+from .tracing import span
+from .predictions import apply_ml_predictions
+from .summary import get_root_cause
+from .stages import set_stage_workers
+from .sharding import set_rule_workers
+
+STAGES = ('parse', 'features', 'rules', 'summary', 'model', 'total')
+
+_model = None  # the --model of a worker process, loaded once by _init_worker
+
+def _init_worker(model_path):
+    global _model
+    # the files already keep every core busy, each one runs its stages and rules in turn
+    set_stage_workers(1)
+    set_rule_workers(1)
+    if model_path is not None:
+        from .models import load_model
+        _model = load_model(model_path)
+
+def read_manifest(path) -> pd.DataFrame:
+    """CSV with a file column (relative to the corpus directory) and a root_cause column."""
+    manifest = pd.read_csv(path, dtype=str)
+    missing = {'file', 'root_cause'} - set(manifest.columns)
+    if missing:
+        raise ValueError(f"Manifest {path} is missing the columns {sorted(missing)}")
+    return manifest
+
+def _record(path, expected, error=None) -> dict:
+    return {
+        'file': path, 'expected': expected, 'predicted': None, 'model_predicted': None,
+        'sustained_episodes': None, 'error': error, 'summary_error': None, 'timings': {},
+    }
+
+def backtest_file(path, expected) -> dict:
+    """
+    Root cause of one file through the whole /process pipeline, with the wall time of each stage.
+    The diagnosis is kept when only the summary fails (summary_error), it doesn't depend on it.
+    """
+    record = _record(path, expected)
+    timings = record['timings']
+    # the pipeline prints whole frames, which would drown the backtest's own output
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            with span('parse', timings=timings):
+                package = preprocess_puc_filepath(path)
+            if package is None:
+                record['error'] = "less than 45 days of data"
+            else:
+                diagnosis = diagnose_package(package, timings)
+                record['predicted'] = diagnosis.root_cause
+                record['sustained_episodes'] = diagnosis.sustained_episodes
+                try:
+                    summarise(diagnosis, timings)
+                except Exception as e:
+                    record['summary_error'] = f"{type(e).__name__}: {e}"
+                if _model is not None:
+                    with span('model', len(diagnosis.df), timings):
+                        df = apply_ml_predictions(diagnosis.df, _model.estimator, _model.features)
+                    record['model_predicted'] = get_root_cause(df, 'Final_Label')
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+    timings['total'] = sum(timings.values())
+    return record
+
+def score(records: list[dict], key: str) -> dict:
+    """Accuracy and per-issue precision / recall of the key root causes of the files that ran."""
+    scored = [record for record in records if record['error'] is None and record[key] is not None]
+    if not scored:
+        return {'files': 0}
+    y_true = [record['expected'] for record in scored]
+    y_pred = [record[key] for record in scored]
+    labels = sorted(set(y_true) | set(y_pred))
+    precision, recall, f1, support = precision_recall_fscore_support(
+        y_true, y_pred, labels=labels, zero_division=0
+    )
+    return {
+        'files': len(scored),
+        'accuracy': accuracy_score(y_true, y_pred),
+        'issues': {
+            label: {'precision': p, 'recall': r, 'f1': f, 'support': int(s)}
+            for label, p, r, f, s in zip(labels, precision, recall, f1, support)
+        },
+    }
+
+def stage_times(records: list[dict]) -> dict:
+    times = {}
+    for stage in STAGES:
+        seconds = [record['timings'][stage] for record in records if stage in record['timings']]
+        if seconds:
+            times[stage] = {'total': sum(seconds), 'mean': sum(seconds) / len(seconds), 'max': max(seconds)}
+    return times
+
+def changed_diagnoses(records: list[dict], baseline: dict, keys=('predicted',)) -> list[dict]:
+    """Files whose root causes (keys of the records) differ from the ones in a previous report."""
+    before = {record['file']: record for record in baseline['files']}
+    changed = []
+    for record in records:
+        previous = before.get(record['file'])
+        if previous is None:
+            continue
+        for key in keys:
+            if previous[key] != record[key]:
+                changed.append({'file': record['file'], 'key': key, 'before': previous[key], 'after': record[key]})
+    return changed
+
+def _backtest_files(files, model_path, max_workers, finished) -> tuple[list, list]:
+    """
+    Backtest (path, expected) files on a new pool, handing each record to finished. At most one
+    file per worker is submitted at a time, so if a worker dies the files in flight are the only
+    suspects: returns them and the files not yet submitted, both empty once every file is done.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    queue = deque(files)
+    in_flight = {}
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        while queue or in_flight:
+            while queue and len(in_flight) < workers:
+                try:
+                    future = pool.submit(backtest_file, *queue[0])
+                except BrokenProcessPool:
+                    return list(in_flight.values()), list(queue)
+                in_flight[future] = queue.popleft()
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except BrokenProcessPool:
+                    return [file, *in_flight.values()], list(queue)
+                except Exception as e:
+                    record = _record(*file, error=f"{type(e).__name__}: {e}")
+                finished(record)
+    return [], []
+
+def run_backtest(corpus, manifest_path, model_path=None, max_workers=None, baseline=None) -> dict:
+    manifest = read_manifest(manifest_path)
+    files = [(os.path.join(corpus, row.file), row.root_cause) for row in manifest.itertuples()]
+    start = time.perf_counter()
+    records = []
+
+    def finished(record):
+        records.append(record)
+        print(f"[{len(records)}/{len(files)}] {record['file']}: {record['error'] or record['predicted']}")
+
+    remaining = files
+    while remaining:
+        suspects, remaining = _backtest_files(remaining, model_path, max_workers, finished)
+        # a worker died (out of memory, killed) and broke the pool: every file in flight failed with
+        # it, so each is redone alone and only one that kills its own worker again is an error
+        for file in suspects:
+            crashed, _ = _backtest_files([file], model_path, 1, finished)
+            if crashed:
+                finished(_record(*file, error="BrokenProcessPool: the worker backtesting this file died"))
+    records.sort(key=lambda record: record['file'])
+
+    report = {
+        'corpus': corpus,
+        'manifest': manifest_path,
+        'model': model_path,
+        'wall_seconds': time.perf_counter() - start,
+        'errors': sum(record['error'] is not None for record in records),
+        'summary_errors': sum(record['summary_error'] is not None for record in records),
+        'rules': score(records, 'predicted'),
+        'stages': stage_times(records),
+        'files': records,
+    }
+    if model_path is not None:
+        report['ml'] = score(records, 'model_predicted')
+    if baseline is not None:
+        # the model diagnoses only compare when both runs scored a model
+        keys = ('predicted', 'model_predicted') if model_path and baseline.get('model') else ('predicted',)
+        report['changed'] = changed_diagnoses(records, baseline, keys)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the root cause diagnosis on a labeled PUC corpus.")
+    parser.add_argument('corpus', help="directory of PUC files")
+    parser.add_argument('manifest', help="CSV of file,root_cause")
+    parser.add_argument('--out', default='backtest_report.json', help="report to write")
+    parser.add_argument('--model', help="also score a joblib model (see models.load_model)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, default one per CPU")
+    parser.add_argument('--baseline', help="previous report to list the changed diagnoses against")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report = run_backtest(args.corpus, args.manifest, args.model, args.workers, baseline)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print(f"{len(report['files'])} files, {report['errors']} errors, {report['wall_seconds']:.1f}s")
+    if report['summary_errors']:
+        print(f"{report['summary_errors']} summaries failed, see summary_error in {args.out}")
+    for name in ('rules', 'ml'):
+        if name in report and report[name]['files']:
+            print(f"{name} accuracy: {report[name]['accuracy']:.3f} over {report[name]['files']} files")
+    for stage, seconds in report['stages'].items():
+        print(f"{stage:>9}: {seconds['mean']:.2f}s mean, {seconds['max']:.2f}s max")
+    if 'changed' in report:
+        print(f"{len(report['changed'])} diagnoses changed against {args.baseline}")
+    print(f"Report written to {args.out}")
+    return 0 if not report['errors'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
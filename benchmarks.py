@@ -0,0 +1,223 @@
+# micro benchmarks of the rule engine kernels against the code they replaced, and per-stage
+# timings of the whole pipeline on synthetic exports of growing length,
+# run with: python -m <package>.benchmarks [zigzag | stages | sharding] [--days 46 90 180 365] [--layout STP] [--repeat 3]
+import io
+import sys
+import time
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+
+from .predictions import is_zigzag, zigzag_rows
+from .predictions import set_flag_conditions as stp_conditions
+from .tsx_predictions import set_flag_conditions as tsx_conditions
+from .preprocessing import preprocess_puc_file, map_door_status_to_df, feature_engineering
+from .pipeline import summary_event_tables
+from .summary import generate_summary
+from .visualizations import (
+    make_flagged, plot_sensor_values, plot_sensor_trends, plot_door_histogram,
+    plot_trend_issue_altair, plot_tc10, plot_tc1_tc6
+)
+from .synthetic import SyntheticSpec, synthetic_puc
+from .sharding import set_rule_workers
+
+# export lengths of the scaling curve; the pipeline needs more than 45 days
+BENCH_DAYS = (46, 90, 180, 365)
+# one fault of each stage, so the rules and the issue plots have work to do
+BENCH_FAULTS = {'STP': ('first_stage_leak', 'second_stage_leak'), 'STP1': ('first_stage_hot_sump',), 'TSX': ('first_stage_leak', 'hslc')}
+
+def _best_of(func, repeat=3) -> tuple[float, object]:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_zigzag(rows=200_000, channels=10, seed=0) -> dict:
+    """Row-wise is_zigzag apply vs zigzag_rows on a random -1/0/1 trend matrix."""
+    rng = np.random.default_rng(seed)
+    trends = pd.DataFrame(
+        rng.integers(-1, 2, size=(rows, channels), dtype=np.int8),
+        columns=[f'TC{i}_trend' for i in range(channels)]
+    )
+
+    row_wise, expected = _best_of(lambda: trends.apply(is_zigzag, axis=1).to_numpy(), repeat=1)
+    vectorized, result = _best_of(lambda: zigzag_rows(trends.to_numpy()))
+    assert np.array_equal(expected, result), "zigzag_rows differs from is_zigzag"
+
+    return {'rows': rows, 'row_wise_s': row_wise, 'vectorized_s': vectorized, 'speedup': row_wise / vectorized}
+
+def bench_sharding(days=365, layout='STP', workers=(1, 2, 4), seed=0, repeat=3) -> pd.DataFrame:
+    """
+    set_flag_conditions of one long synthetic export in one pass (1 worker) and sharded on the
+    rule pool, best of repeat runs after a warm-up that starts the pool; every result must
+    equal the one-pass frame.
+    """
+    raw = synthetic_puc(SyntheticSpec(days=days, layout=layout, faults=BENCH_FAULTS[layout], seed=seed))
+    with contextlib.redirect_stdout(io.StringIO()):
+        df, door_events, power_events, ref_df, file_type, note = preprocess_puc_file(raw)
+        df, _ = feature_engineering(df)
+
+    def rules():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return tsx_conditions(df.copy(), ref_df) if layout == 'TSX' else stp_conditions(df.copy())
+
+    rows, expected = [], None
+    try:
+        for count in workers:
+            set_rule_workers(count)
+            rules()
+            seconds, result = _best_of(rules, repeat)
+            if expected is None:
+                expected = result
+            assert result.equals(expected), f"{count} rule workers differ from the one-pass result"
+            rows.append({'workers': count, 'seconds': seconds})
+    finally:
+        set_rule_workers(None)
+
+    table = pd.DataFrame(rows).set_index('workers')
+    table['speedup'] = table['seconds'].iloc[0] / table['seconds']
+    table.attrs['rows'] = len(df)
+    return table
+
+def _stage(result: dict, stage: str, func, *args):
+    # one run of a stage: its wall seconds go into result['timings'], or the error that stopped it
+    # into result['errors'], never both, so a failed stage can't pass for a timing
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            value = func(*args)
+    except Exception as e:
+        result['errors'][stage] = f"{type(e).__name__}: {e}"
+        return None
+    result['timings'][stage] = time.perf_counter() - start
+    return value
+
+def _download_word(client, summary: dict):
+    response = client.post('/download_word', json=summary)
+    if response.status_code != 200:
+        raise RuntimeError(f"/download_word returned {response.status_code}")
+    return response.data
+
+def bench_stages(days=46, layout='STP', seed=0) -> dict:
+    """
+    Wall seconds of every pipeline stage on one synthetic export (timings), and the errors of the
+    stages that failed (errors); a stage that needs the frame of a failed one doesn't run.
+    """
+    raw = synthetic_puc(SyntheticSpec(days=days, layout=layout, faults=BENCH_FAULTS[layout], seed=seed))
+    result = {'days': days, 'layout': layout, 'bytes': len(raw), 'timings': {}, 'errors': {}}
+
+    package = _stage(result, 'preprocess_puc_file', preprocess_puc_file, raw)
+    if package is None:
+        return result
+    df, door_events, power_events, ref_df, file_type, note = package
+    result['rows'] = len(df)
+    _stage(result, 'map_door_status_to_df', map_door_status_to_df, df.copy(), door_events)
+
+    engineered = _stage(result, 'feature_engineering', feature_engineering, df)
+    if engineered is None:
+        return result
+    df, tcs = engineered
+    flagged_stp = _stage(result, 'stp set_flag_conditions', stp_conditions, df.copy())
+    flagged_tsx = _stage(result, 'tsx set_flag_conditions', tsx_conditions, df.copy(), ref_df)
+    df = flagged_tsx if file_type == 'TSX' else flagged_stp
+    if df is None:
+        return result
+
+    filtered = df.loc[df['Sustained_Issue'] == True, ['Date/Time', 'Trend_Flag']]
+    door_events_filtered, power_daily = summary_event_tables(door_events, power_events)
+    summary = _stage(
+        result, 'generate_summary', generate_summary,
+        df, door_events_filtered, power_daily, door_events, tcs, ref_df, filtered
+    )
+
+    # the frames /visualizations hands to the plots
+    flagged = _stage(result, 'make_flagged', make_flagged, filtered)
+    if flagged is not None:
+        values = ['Date/Time', 'RTD', 'Setpoint', 'TC1', 'TC2', 'TC10', 'TC3', 'TC8', 'TC4', 'TC6']
+        trends = ['Date/Time', 'RTD_trend', 'Stage 1 RPM', 'Stage 2 RPM', 'TC1_trend', 'TC2_trend',
+                  'TC10_trend', 'TC8_trend', 'TC3_trend', 'TC4_trend', 'TC6_trend', 'Trend_Flag']
+        _stage(result, 'plot_sensor_values', plot_sensor_values, df[[c for c in values if c in df.columns]], flagged)
+        _stage(result, 'plot_sensor_trends', plot_sensor_trends, df[[c for c in trends if c in df.columns]], flagged)
+    _stage(result, 'plot_door_histogram', plot_door_histogram, door_events)
+    _stage(result, 'plot_trend_issue_altair', plot_trend_issue_altair, df)
+    _stage(result, 'plot_tc10', plot_tc10, df)
+    _stage(result, 'plot_tc1_tc6', plot_tc1_tc6, df)
+    if summary is not None:
+        from . import create_app
+        with create_app().test_client() as client:
+            _stage(result, 'download_word', _download_word, client, summary)
+    return result
+
+def scaling_exponent(rows, seconds) -> float | None:
+    """Slope of log(seconds) over log(rows): ~1 for a linear stage, ~2 for a quadratic one."""
+    points = [(r, s) for r, s in zip(rows, seconds) if s is not None and s > 0]
+    if len(points) < 2:
+        return None
+    x, y = np.log([r for r, _ in points]), np.log([s for _, s in points])
+    return float(np.polyfit(x, y, 1)[0])
+
+def _best_stages(runs: list[dict]) -> dict:
+    # the fastest time of each stage over repeated bench_stages runs, and every stage that failed in any
+    best = dict(runs[0])
+    best['timings'], best['errors'] = {}, {}
+    for run in runs:
+        for stage, seconds in run['timings'].items():
+            best['timings'][stage] = min(seconds, best['timings'].get(stage, seconds))
+        for stage, error in run['errors'].items():
+            best['errors'].setdefault(stage, error)
+    return best
+
+def bench_scaling(days=BENCH_DAYS, layout='STP', seed=0, repeat=1) -> pd.DataFrame:
+    """
+    bench_stages over export lengths (best of repeat runs), as a stage x days table of
+    seconds plus each stage's scaling exponent; the failed stages are in attrs['errors'] as
+    (days, stage, error), their cells are empty.
+    """
+    bench_stages(min(days), layout, seed)  # warm-up: imports and first-call costs stay out of the curve
+    results = [_best_stages([bench_stages(d, layout, seed) for _ in range(repeat)]) for d in days]
+    stages = list(dict.fromkeys(stage for result in results for stage in result['timings']))
+    table = pd.DataFrame(
+        {result['days']: [result['timings'].get(stage) for stage in stages] for result in results},
+        index=stages
+    )
+    rows = [result.get('rows', 0) for result in results]
+    table['exponent'] = [scaling_exponent(rows, [result['timings'].get(stage) for result in results]) for stage in stages]
+    table.attrs['rows'] = dict(zip(days, rows))
+    table.attrs['errors'] = [
+        (result['days'], stage, error) for result in results for stage, error in result['errors'].items()
+    ]
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the rule kernels and the pipeline stages.")
+    parser.add_argument('suite', nargs='?', choices=('zigzag', 'stages', 'sharding'), default='stages')
+    parser.add_argument('--days', type=float, nargs='+', default=list(BENCH_DAYS))
+    parser.add_argument('--layout', choices=tuple(BENCH_FAULTS), default='STP')
+    parser.add_argument('--repeat', type=int, default=1, help="runs per length, the fastest counts")
+    args = parser.parse_args(argv)
+
+    if args.suite == 'zigzag':
+        print(bench_zigzag())
+        return 0
+    if args.suite == 'sharding':
+        table = bench_sharding(int(max(args.days)), args.layout, repeat=args.repeat)
+        print(f"rules of {table.attrs['rows']} rows:")
+        print(table.to_string(float_format='{:.3f}'.format))
+        return 0
+    table = bench_scaling(args.days, args.layout, repeat=args.repeat)
+    print(f"rows per export: {table.attrs['rows']}")
+    with pd.option_context('display.width', 200, 'display.max_colwidth', 40, 'display.float_format', '{:.3f}'.format):
+        print(table)
+    errors = table.attrs['errors']
+    if errors:
+        print(f"\n{len(errors)} stage runs FAILED, their timings are missing:", file=sys.stderr)
+        for days, stage, error in errors:
+            print(f"  {days:g} days, {stage}: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,168 @@
+# content-addressed on-disk cache of parsed and analysed uploads
+import os
+import json
+import shutil
+import hashlib
+import inspect
+import tempfile
+import threading
+import pandas as pd
+
+from . import preprocessing, labels, rules, sharding, predictions, tsx_predictions, summary, visualizations, pipeline
+
+DEFAULT_CACHE_MAX_BYTES = 2 << 30
+
+PARSED_STAGE = 'parsed'
+ANALYSIS_STAGE = 'analysis'
+
+def _source_version(*modules) -> str:
+    # any edit to the code a stage depends on invalidates that stage
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(inspect.getsource(module).encode())
+    return digest.hexdigest()[:16]
+
+# the parsed frames depend on the ingest code only, the analysis also on the rules and thresholds
+PARSER_VERSION = _source_version(preprocessing)
+RULESET_VERSION = _source_version(
+    preprocessing, labels, rules, sharding, predictions, tsx_predictions, summary, visualizations, pipeline
+)
+
+def upload_digest(stream, chunk_size=preprocessing.DEFAULT_CHUNK_SIZE) -> str | None:
+    """SHA-256 of a seekable upload stream, which is rewound afterwards. None if it can't seek."""
+    if not (hasattr(stream, 'seek') and hasattr(stream, 'tell')):
+        return None
+    try:
+        start = stream.tell()
+    except OSError:
+        return None
+
+    digest = hashlib.sha256()
+    while chunk := stream.read(chunk_size):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.hexdigest()
+
+def uploads_digest(streams) -> str | None:
+    """Key of a set of uploads, in order. A single upload keeps its own digest."""
+    digests = [upload_digest(stream) for stream in streams]
+    if None in digests:
+        return None
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256(' '.join(digests).encode()).hexdigest()
+
+class AnalysisCache:
+    """
+    Parsed frames and event tables (Parquet) and the final summary (JSON) of
+    uploads, keyed by the SHA-256 of the raw bytes. Each upload is one entry
+    directory with a sub-directory per stage and version; whole entries are
+    evicted least recently used first once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = {
+            stage: {'hits': 0, 'misses': 0} for stage in (PARSED_STAGE, ANALYSIS_STAGE)
+        }
+        self.stats['evictions'] = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _stage_dir(self, digest: str, stage: str) -> str:
+        version = PARSER_VERSION if stage == PARSED_STAGE else RULESET_VERSION
+        return os.path.join(self.root, digest, f'{stage}-{version}')
+
+    def _count(self, stage: str, hit: bool) -> None:
+        with self._lock:
+            self.stats[stage]['hits' if hit else 'misses'] += 1
+
+    def _load(self, digest: str, stage: str) -> tuple[dict, dict[str, pd.DataFrame]] | None:
+        stage_dir = self._stage_dir(digest, stage)
+        try:
+            with open(os.path.join(stage_dir, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            frames = {
+                name: pd.read_parquet(os.path.join(stage_dir, f'{name}.parquet'))
+                for name in meta['frames']
+            }
+        except (OSError, ValueError, KeyError):
+            self._count(stage, hit=False)
+            return None
+
+        # a hit makes the whole entry the most recently used
+        os.utime(os.path.join(self.root, digest))
+        self._count(stage, hit=True)
+        return meta, frames
+
+    def _store(self, digest: str, stage: str, meta: dict, frames: dict[str, pd.DataFrame]) -> None:
+        stage_dir = self._stage_dir(digest, stage)
+        entry_dir = os.path.dirname(stage_dir)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        # written next to its final place and renamed in, so readers never see half a stage
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=entry_dir)
+        try:
+            for name, frame in frames.items():
+                frame.to_parquet(os.path.join(tmp_dir, f'{name}.parquet'), index=False)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({**meta, 'frames': list(frames)}, f, default=str)
+            shutil.rmtree(stage_dir, ignore_errors=True)
+            os.replace(tmp_dir, stage_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        os.utime(entry_dir)
+        self._evict()
+
+    def load_parsed(self, digest: str):
+        """The preprocess_puc_file tuple of an upload, or None on a miss."""
+        cached = self._load(digest, PARSED_STAGE)
+        if cached is None:
+            return None
+        meta, frames = cached
+        return (
+            frames['df'], frames['door_events'], frames['power_events'], frames['ref_df'],
+            meta['file_type'], meta['note']
+        )
+
+    def store_parsed(self, digest: str, package) -> None:
+        df, door_events, power_events, ref_df, file_type, note = package
+        self._store(digest, PARSED_STAGE, {'file_type': file_type, 'note': note}, {
+            'df': df, 'door_events': door_events, 'power_events': power_events, 'ref_df': ref_df
+        })
+
+    def load_analysis(self, digest: str) -> tuple[dict, pd.DataFrame] | None:
+        """The summary JSON and the analysed frame of an upload, or None on a miss."""
+        cached = self._load(digest, ANALYSIS_STAGE)
+        if cached is None:
+            return None
+        meta, frames = cached
+        return meta['summary'], frames['df']
+
+    def store_analysis(self, digest: str, summary: dict, df: pd.DataFrame) -> None:
+        self._store(digest, ANALYSIS_STAGE, {'summary': summary}, {'df': df})
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            if not os.path.isdir(entry_dir):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(dirpath, filename))
+                for dirpath, _, filenames in os.walk(entry_dir) for filename in filenames
+            )
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            total += size
+
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.stats['evictions'] += 1
\ No newline at end of file
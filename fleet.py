@@ -0,0 +1,208 @@
+# root cause of every PUC export under a directory, analysed on all cores into one result table,
+# run with: python -m <package>.fleet DIRECTORY [--out fleet.parquet] [--workers N] [--retry-errors]
+import os
+import io
+import sys
+import time
+import fnmatch
+import argparse
+import contextlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+
+from .preprocessing import preprocess_puc_filepath
+from .pipeline import diagnose_package, summarise
+from .tracing import span
+from .stages import set_stage_workers
+from .sharding import set_rule_workers
+
+DEFAULT_PATTERN = '*.puc'
+STAGES = ('parse', 'features', 'rules', 'summary')
+COLUMNS = (
+    'file', 'bytes', 'mtime', 'rows', 'file_type', 'root_cause', 'sustained_episodes', 'sustained_rows',
+    'error', 'summary_error', *(f'{stage}_s' for stage in STAGES), 'total_s',
+)
+
+def _init_worker():
+    # the files already keep every core busy, each worker runs the stages and rules of its file in turn
+    set_stage_workers(1)
+    set_rule_workers(1)
+
+def find_exports(root, pattern=DEFAULT_PATTERN) -> list[str]:
+    """Paths relative to root of the files matching pattern (any case), in sorted order."""
+    found = []
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if fnmatch.fnmatch(filename.lower(), pattern.lower()):
+                found.append(os.path.relpath(os.path.join(directory, filename), root))
+    return sorted(found)
+
+def analyse_file(root, file) -> dict:
+    """
+    One row of the fleet table: the diagnosis of root/file and the wall time of each stage.
+    The diagnosis is kept when only the summary fails (summary_error).
+    """
+    path = os.path.join(root, file)
+    stat = os.stat(path)
+    row = dict.fromkeys(COLUMNS)
+    row.update(file=file, bytes=stat.st_size, mtime=stat.st_mtime)
+    timings = {}
+    # the pipeline prints whole frames, which would drown the progress lines
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            with span('parse', timings=timings):
+                package = preprocess_puc_filepath(path)
+            if package is None:
+                row['error'] = "less than 45 days of data"
+            else:
+                diagnosis = diagnose_package(package, timings)
+                row.update(
+                    rows=len(diagnosis.df),
+                    file_type=diagnosis.file_type,
+                    root_cause=diagnosis.root_cause,
+                    sustained_episodes=diagnosis.sustained_episodes,
+                    sustained_rows=len(diagnosis.filtered),
+                )
+                try:
+                    summarise(diagnosis, timings)
+                except Exception as e:
+                    row['summary_error'] = f"{type(e).__name__}: {e}"
+        except Exception as e:
+            row['error'] = f"{type(e).__name__}: {e}"
+    for stage, seconds in timings.items():
+        row[f'{stage}_s'] = seconds
+    row['total_s'] = sum(timings.values())
+    return row
+
+def progress_path(out) -> str:
+    return f'{out}.progress.csv'
+
+def read_progress(path) -> pd.DataFrame:
+    """The rows finished so far, the latest one per file."""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=COLUMNS)
+    done = pd.read_csv(path, float_precision='round_trip')
+    return done.drop_duplicates('file', keep='last').reset_index(drop=True)
+
+def pending_files(root, files, done: pd.DataFrame, retry_errors=False) -> list[str]:
+    """The files without a finished row, changed since (size or modification time), or failed if retry_errors."""
+    finished = {row.file: row for row in done.itertuples(index=False)}
+    pending = []
+    for file in files:
+        row = finished.get(file)
+        if row is None or (retry_errors and isinstance(row.error, str)):
+            pending.append(file)
+            continue
+        stat = os.stat(os.path.join(root, file))
+        if row.bytes != stat.st_size or row.mtime != stat.st_mtime:
+            pending.append(file)
+    return pending
+
+def write_table(table: pd.DataFrame, out) -> None:
+    if out.lower().endswith('.parquet'):
+        table.to_parquet(out, index=False)
+    else:
+        table.to_csv(out, index=False)
+
+def _analyse_files(root, files, max_workers, finished) -> tuple[list[str], list[str]]:
+    """
+    Analyse files on a new pool, handing each finished row to finished. At most one file per
+    worker is submitted at a time, so if a worker dies the files in flight are the only suspects:
+    returns them and the files not yet submitted, both empty once every file is done.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    queue = deque(files)
+    in_flight = {}
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        try:
+            while queue or in_flight:
+                while queue and len(in_flight) < workers:
+                    try:
+                        future = pool.submit(analyse_file, root, queue[0])
+                    except BrokenProcessPool:
+                        return list(in_flight.values()), list(queue)
+                    in_flight[future] = queue.popleft()
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file = in_flight.pop(future)
+                    try:
+                        row = future.result()
+                    except BrokenProcessPool:
+                        return [file, *in_flight.values()], list(queue)
+                    except Exception as e:
+                        row = dict.fromkeys(COLUMNS, None)
+                        row.update(file=file, error=f"{type(e).__name__}: {e}")
+                    finished(row)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    return [], []
+
+def run_fleet(root, out, pattern=DEFAULT_PATTERN, max_workers=None, retry_errors=False) -> pd.DataFrame:
+    """
+    Analyse the exports under root in worker processes and write the table to out (Parquet or CSV).
+    Each finished file is appended to out.progress.csv at once, so an interrupted run resumes where
+    it stopped: files already in it are skipped unless they changed.
+    """
+    files = find_exports(root, pattern)
+    journal = progress_path(out)
+    pending = pending_files(root, files, read_progress(journal), retry_errors)
+    print(f"{len(files)} exports under {root}, {len(files) - len(pending)} done, {len(pending)} to analyse")
+
+    start = time.perf_counter()
+    header = not os.path.exists(journal) or os.path.getsize(journal) == 0
+    if not header and list(pd.read_csv(journal, nrows=0).columns) != list(COLUMNS):
+        # a journal of an earlier version, rewritten with the current columns before appending
+        read_progress(journal).reindex(columns=COLUMNS).to_csv(journal, index=False)
+    done = 0
+    with open(journal, 'a', newline='', encoding='utf-8') as progress:
+        def finished(row):
+            nonlocal header, done
+            pd.DataFrame([row], columns=COLUMNS).to_csv(progress, header=header, index=False)
+            progress.flush()
+            header = False
+            done += 1
+            print(f"[{done}/{len(pending)}] {row['file']}: {row['error'] or row['root_cause']}")
+
+        remaining = pending
+        while remaining:
+            suspects, remaining = _analyse_files(root, remaining, max_workers, finished)
+            # a worker died (out of memory, killed) and broke the pool: every file in flight failed
+            # with it, so each is redone alone and only one that kills its own worker again is failed,
+            # a rerun with --retry-errors redoes it
+            for file in suspects:
+                crashed, _ = _analyse_files(root, [file], 1, finished)
+                if crashed:
+                    row = dict.fromkeys(COLUMNS, None)
+                    row.update(file=file, error="BrokenProcessPool: the worker analysing this file died")
+                    finished(row)
+
+    # exports removed since an earlier run drop out of the table
+    table = read_progress(journal)
+    table = table[table['file'].isin(files)].sort_values('file', ignore_index=True)
+    write_table(table, out)
+    print(f"{len(pending)} exports analysed in {time.perf_counter() - start:.1f}s, {len(table)} rows written to {out}")
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diagnose every PUC export under a directory.")
+    parser.add_argument('directory', help="searched recursively")
+    parser.add_argument('--out', default='fleet.parquet', help="result table, .parquet or .csv")
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN, help="file names to analyse")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, default one per CPU")
+    parser.add_argument('--retry-errors', action='store_true', help="redo the files that failed in an earlier run")
+    args = parser.parse_args(argv)
+
+    try:
+        table = run_fleet(args.directory, args.out, args.pattern, args.workers, args.retry_errors)
+    except KeyboardInterrupt:
+        print(f"Interrupted, rerun the same command to resume from {progress_path(args.out)}")
+        return 130
+    if len(table):
+        print(table['root_cause'].value_counts(dropna=False).to_string())
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
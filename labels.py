@@ -0,0 +1,92 @@
+# registry of the issue labels; Trend_Flag and the ML labels are stored as its integer codes
+import numpy as np
+import pandas as pd
+
+DEFAULT_FLAG = "No issue detected - your device is working properly"
+DOOR_IGNORED_FLAG = "Door Open Event, Ignored"
+NO_ISSUE_FLAG = "No issue detected"
+UNKNOWN_LABEL = "Unknown"
+
+# labels that never count as an issue (root cause, sustained runs)
+NOT_ISSUES = (DEFAULT_FLAG, DOOR_IGNORED_FLAG)
+
+# labels the model predicts, by the class code it was trained with
+MODEL_LABELS = {
+    0: DEFAULT_FLAG,
+    1: '1st stage hot sump failure issue',
+    # 2: "1st stage compressor start components issue",
+    3: '1st stage compression failure',
+    4: '1st stage issue',
+    5: "1st stage leak issue",
+    6: "1st stage low charge issue",
+    7: '2nd stage hot sump issue',
+    8: "2nd stage compressor start components issue",
+    9: '2nd stage compression failure',
+    10: '2nd stage issue',
+    11: "2nd stage leak issue",
+    12: '2nd stage insulation issue (Armaflex)',
+    13: "2nd stage low charge issue",
+    14: 'Intermittent Fan Issue',
+    # 15: 'VIP Panel Issues',
+    16: 'HSLC',
+}
+
+# labels of the STP and TSX rule tables; compile_rules rejects any other
+RULE_LABELS = (
+    DOOR_IGNORED_FLAG,
+    "1st stage hot sump",
+    "2nd stage hot sump",
+    "HSLC",
+    "Intermittent Fan Issue",
+    "1st stage leak issue",
+    "1st stage issue",
+    "1st stage compression issue",
+    "1st stage compressor start components issue",
+    "1st stage compressor inverter issue",
+    "2nd stage leak issue",
+    "2nd stage issue",
+    "2nd stage compression issue",
+    "2nd stage compressor start components issue",
+    "2nd stage compressor inverter issue",
+    "2nd stage insulation issue (Armaflex)",
+)
+
+# sorted, so ordering by code is ordering by text and sorts / groupbys come out as they did on strings
+ISSUE_LABELS = tuple(sorted({
+    DEFAULT_FLAG, NO_ISSUE_FLAG, UNKNOWN_LABEL, *RULE_LABELS, *MODEL_LABELS.values()
+}))
+ISSUE_DTYPE = pd.CategoricalDtype(ISSUE_LABELS)
+CODE_DTYPE = np.int8
+
+def label_codes(labels) -> np.ndarray:
+    """Registry codes of labels, -1 for any label that is not registered."""
+    return ISSUE_DTYPE.categories.get_indexer(list(labels)).astype(CODE_DTYPE)
+
+def issue_labels(codes) -> pd.Categorical:
+    """Registry codes as a Categorical of the issue labels (-1 is missing)."""
+    return pd.Categorical.from_codes(codes, dtype=ISSUE_DTYPE)
+
+def issue_codes(values) -> np.ndarray:
+    """Registry codes of a label column, whether strings or a Categorical; -1 if unregistered."""
+    return pd.Series(values).astype(ISSUE_DTYPE).cat.codes.to_numpy()
+
+def model_label_codes(predictions) -> np.ndarray:
+    """Registry codes of model class codes, UNKNOWN_LABEL for a class outside MODEL_LABELS."""
+    lookup = dict(zip(MODEL_LABELS, label_codes(MODEL_LABELS.values())))
+    unknown = label_codes([UNKNOWN_LABEL])[0]
+    return pd.Series(predictions).map(lookup).fillna(unknown).to_numpy(dtype=CODE_DTYPE)
+
+def factorize_labels(values) -> tuple[np.ndarray, pd.Index]:
+    """
+    Integer codes and labels of a label column: the categorical codes as they are, a column
+    of strings factorized. Missing values are -1.
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories
+    codes, uniques = pd.factorize(values)
+    return codes, pd.Index(uniques)
+
+def not_issue_codes(categories: pd.Index) -> np.ndarray:
+    """Codes of NOT_ISSUES among categories, and -1 so that missing labels never count either."""
+    return np.append(categories.get_indexer(list(NOT_ISSUES)), -1)
\ No newline at end of file
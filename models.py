@@ -0,0 +1,157 @@
+# scikit-learn models served by /predict, loaded once per app
+import os
+import time
+import queue
+import threading
+from dataclasses import dataclass
+from concurrent.futures import Future
+import joblib
+import numpy as np
+import pandas as pd
+
+from .predictions import predict_chunked, DEFAULT_PREDICT_CHUNK_ROWS
+
+MODEL_EXTENSIONS = ('.joblib', '.pkl')
+DEFAULT_BATCH_WINDOW = 0.005  # seconds a batch stays open for more requests
+DEFAULT_MAX_BATCH_ROWS = DEFAULT_PREDICT_CHUNK_ROWS
+
+@dataclass
+class LoadedModel:
+    name: str
+    estimator: object
+    features: list[str]
+    path: str
+
+def load_model(path) -> LoadedModel:
+    """
+    A model file written by joblib.dump. With mmap_mode the numpy arrays it holds (e.g.
+    coefficients) are mapped read-only instead of copied, so worker processes forked after
+    create_app share one copy through the page cache. Estimators that copy arrays into their
+    own buffers when unpickled (tree nodes) and compressed files still load into memory.
+    """
+    estimator = joblib.load(path, mmap_mode='r')
+    # the feature list comes from the frame the model was fitted on
+    features = getattr(estimator, 'feature_names_in_', None)
+    if features is None:
+        raise ValueError("model was not fitted on a DataFrame, its feature names are unknown")
+    name = os.path.splitext(os.path.basename(path))[0]
+    return LoadedModel(name, estimator, [str(feature) for feature in features], path)
+
+class MicroBatcher:
+    """
+    Scores the feature rows of concurrent requests to one model together: the first waiting
+    request opens a batch, every request arriving within window seconds joins it (up to
+    max_rows rows) and the batch is one predict_chunked call on a background thread.
+    """
+
+    def __init__(self, model: LoadedModel, window=DEFAULT_BATCH_WINDOW, max_rows=DEFAULT_MAX_BATCH_ROWS, max_workers=None):
+        self.model = model
+        self.window = window
+        self.max_rows = max_rows
+        self.max_workers = max_workers
+        self.stats = {'batches': 0, 'requests': 0, 'rows': 0}
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f'predict-{model.name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: pd.DataFrame) -> Future:
+        """Future of the model's predictions for rows (a frame of the model's features)."""
+        future = Future()
+        self._requests.put((rows, future))
+        return future
+
+    def _next_batch(self) -> list:
+        batch = [self._requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+            size += len(batch[-1][0])
+        return batch
+
+    def _predict(self, rows: pd.DataFrame) -> np.ndarray:
+        return predict_chunked(self.model.estimator, rows, self.model.features, max_workers=self.max_workers)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                predictions = self._predict(pd.concat([rows for rows, _ in batch], ignore_index=True))
+            except Exception:
+                # one bad request must not fail the others, score them one by one instead
+                for rows, future in batch:
+                    try:
+                        future.set_result(self._predict(rows))
+                    except Exception as e:
+                        future.set_exception(e)
+            else:
+                offsets = np.cumsum([len(rows) for rows, _ in batch])[:-1]
+                for (_, future), part in zip(batch, np.split(predictions, offsets)):
+                    future.set_result(part)
+
+            self.stats['batches'] += 1
+            self.stats['requests'] += len(batch)
+            self.stats['rows'] += sum(len(rows) for rows, _ in batch)
+
+class ModelRegistry:
+    """
+    Every model file in root, loaded once and keyed by its file name without extension.
+    Each model gets its MicroBatcher on first use, so the batching threads are started in
+    the process that serves requests, not in one that forks workers later.
+    """
+
+    def __init__(self, root, batch_window=DEFAULT_BATCH_WINDOW, max_batch_rows=DEFAULT_MAX_BATCH_ROWS, max_workers=None):
+        self.root = root
+        self.batch_window = batch_window
+        self.max_batch_rows = max_batch_rows
+        self.max_workers = max_workers
+        self.models: dict[str, LoadedModel] = {}
+        self._batchers: dict[str, MicroBatcher] = {}
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(root):
+            return
+        for filename in sorted(os.listdir(root)):
+            if not filename.endswith(MODEL_EXTENSIONS):
+                continue
+            try:
+                model = load_model(os.path.join(root, filename))
+            except Exception as e:
+                print(f"Could not load model {filename}: {e}")
+                continue
+            self.models[model.name] = model
+
+    def get(self, name=None) -> LoadedModel:
+        """The named model, or the only one when name is None. KeyError if there is no such model."""
+        if name is None and len(self.models) == 1:
+            return next(iter(self.models.values()))
+        if name not in self.models:
+            raise KeyError(f"Unknown model {name!r}, loaded: {sorted(self.models)}")
+        return self.models[name]
+
+    def batcher(self, name) -> MicroBatcher:
+        with self._lock:
+            if name not in self._batchers:
+                self._batchers[name] = MicroBatcher(
+                    self.get(name), self.batch_window, self.max_batch_rows, self.max_workers
+                )
+            return self._batchers[name]
+
+    def predict(self, name, rows: pd.DataFrame) -> np.ndarray:
+        """Predictions of the named model for rows, scored in a micro-batch with concurrent callers."""
+        return self.batcher(name).submit(rows).result()
+
+    def describe(self) -> dict:
+        return {
+            name: {
+                'features': model.features,
+                'batches': dict(self._batchers[name].stats) if name in self._batchers else None,
+            }
+            for name, model in self.models.items()
+        }
\ No newline at end of file
@@ -0,0 +1,113 @@
+# the analysis /process runs on a parsed upload, shared with the backtest
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+from .preprocessing import feature_engineering
+from .predictions import set_flag_conditions as stp_conditions
+from .tsx_predictions import set_flag_conditions as tsx_conditions
+from .predictions import run_lengths
+from .summary import generate_summary, summary_root_cause
+from .tracing import span
+
+@dataclass
+class Diagnosis:
+    """The rule engine's verdict on a parsed upload, and what its summary is built from."""
+    df: pd.DataFrame
+    filtered: pd.DataFrame  # Date/Time and Trend_Flag of the sustained issue rows
+    root_cause: str
+    tcs: dict
+    file_type: str
+    note: str
+    door_events_original: pd.DataFrame
+    door_events_filtered: pd.DataFrame
+    power_events_df: pd.DataFrame
+    ref_df: pd.DataFrame
+
+    @property
+    def sustained_episodes(self) -> int:
+        runs = run_lengths(self.df['Sustained_Issue'].to_numpy(dtype=bool))
+        return int(np.count_nonzero(runs.values))
+
+@dataclass
+class Analysis:
+    summary: dict
+    df: pd.DataFrame
+    filtered: pd.DataFrame  # Date/Time and Trend_Flag of the sustained issue rows
+    root_cause: str
+    timings: dict[str, float] = field(default_factory=dict)
+
+def summary_event_tables(door_events_original: pd.DataFrame, power_events_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """The door openings longer than a minute, and the power events counted per day and event."""
+    if 'Total Time of Opening (secs)' in door_events_original.columns:
+        door_events_filtered = door_events_original[door_events_original['Total Time of Opening (secs)'] > 60]
+
+    else:
+        print("No 'Total Time of Opening (secs)' column found in door_events_original.")
+        door_events_filtered = pd.DataFrame()  # Empty DataFrame
+
+    if ('Date of Event' in power_events_df.columns) and ('Event' in power_events_df.columns):
+        power_events_df = (
+            power_events_df
+            .groupby(['Date of Event', 'Event'])
+            .size()
+            .reset_index(name='Count of This Event on Day')
+        )
+
+    else:
+        print("No 'Date of Event' and/or 'Event' columns found in power_events_df.")
+        power_events_df = pd.DataFrame()  # Empty DataFrame
+
+    return door_events_filtered, power_events_df
+
+def diagnose_package(package, timings: dict | None = None) -> Diagnosis:
+    """
+    Features, rules and root cause of a preprocess_puc_* result, everything but the summary
+    (which reads the issues workbook). Each stage is a tracing span, its wall time also added
+    to timings (features, rules).
+    """
+    timings = {} if timings is None else timings
+    df, door_events_original, power_events_df, ref_df, file_type, note = package
+
+    with span('features', len(df), timings):
+        df, tcs = feature_engineering(df)
+
+    door_events_filtered, power_events_df = summary_event_tables(door_events_original, power_events_df)
+
+    with span('rules', len(df), timings):
+        if file_type == 'TSX':
+            df = tsx_conditions(df, ref_df)
+
+        else:
+            df = stp_conditions(df)
+        root_cause = summary_root_cause(df, power_events_df)
+
+    filtered = df.loc[df['Sustained_Issue'] == True, ['Date/Time', 'Trend_Flag']]
+    return Diagnosis(
+        df, filtered, root_cause, tcs, file_type, note,
+        door_events_original, door_events_filtered, power_events_df, ref_df
+    )
+
+def summarise(diagnosis: Diagnosis, timings: dict | None = None) -> dict:
+    """The /process summary of a diagnosis, timed as the summary stage."""
+    timings = {} if timings is None else timings
+    with span('summary', len(diagnosis.df), timings):
+        summary = generate_summary(
+            diagnosis.df, diagnosis.door_events_filtered, diagnosis.power_events_df,
+            diagnosis.door_events_original, diagnosis.tcs, diagnosis.ref_df, diagnosis.filtered,
+            diagnosis.root_cause
+        )
+
+    summary['file_type'] = diagnosis.file_type
+    summary['note'] = diagnosis.note
+    return summary
+
+def analyse_package(package, timings: dict | None = None) -> Analysis:
+    """
+    Features, rules and summary of a preprocess_puc_* result. Each stage is a tracing span,
+    its wall time also added to timings (features, rules, summary) kept on the Analysis.
+    """
+    timings = {} if timings is None else timings
+    diagnosis = diagnose_package(package, timings)
+    summary = summarise(diagnosis, timings)
+    return Analysis(summary, diagnosis.df, diagnosis.filtered, diagnosis.root_cause, timings)
\ No newline at end of file
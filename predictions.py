@@ -1,48 +1,130 @@
+import time
+import logging
 import numpy as np
 import pandas as pd
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from sklearn.metrics import accuracy_score, confusion_matrix
+from .preprocessing import column_profile
+from .rules import Rule, compile_rules, evaluate_rules, RTD_WARMING, TC3_TC4_CONNECTED, DOOR_IGNORED_FLAG
+from .labels import (
+    NO_ISSUE_FLAG, factorize_labels, issue_codes, issue_labels, label_codes, model_label_codes, not_issue_codes
+)
 
+DEFAULT_PREDICT_CHUNK_ROWS = 1 << 16
+# above this share of distinct feature rows (continuous features) every row is predicted
+DEFAULT_DEDUP_MAX_RATIO = 0.5
 
-def apply_ml_predictions(new_df, model, features):
-    X_new = new_df[features]  # replace with the feature list used during training
-    predictions = model.predict(X_new)
-
-    label_mapping = {
-    0: "No issue detected - your device is working properly",
-    1: '1st stage hot sump failure issue',
-    # 2: "1st stage compressor start components issue",
-    3: '1st stage compression failure',
-    4:  '1st stage issue',
-    5:  "1st stage leak issue",
-    6:  "1st stage low charge issue",
-    7:  '2nd stage hot sump issue',
-    8: "2nd stage compressor start components issue",
-    9: '2nd stage compression failure',
-    10: '2nd stage issue',
-    11: "2nd stage leak issue",
-    12: '2nd stage insulation issue (Armaflex)',
-    13:  "2nd stage low charge issue",
-    14: 'Intermittent Fan Issue',
-    # 15:  'VIP Panel Issues',
-    16:    'HSLC',
+def predict_chunked(model, df: pd.DataFrame, features, chunk_rows=DEFAULT_PREDICT_CHUNK_ROWS, max_workers=None) -> np.ndarray:
+    """
+    model.predict over df[features] in chunks of chunk_rows rows, so only one chunk of
+    features is materialised at a time (per worker). With max_workers the chunks are
+    predicted on a thread pool; the predictions keep the row order either way.
+    """
+    columns = df.columns.get_indexer_for(features)
+    if (columns < 0).any():
+        missing = [feature for feature, column in zip(features, columns) if column < 0]
+        raise KeyError(f"{missing} not in index")
+
+    # an empty frame still gets its one (empty) predict call
+    starts = range(0, max(len(df), 1), chunk_rows)
+    def predict_chunk(start):
+        return model.predict(df.iloc[start:start + chunk_rows, columns])
+
+    if max_workers is None or len(starts) == 1:
+        chunks = [predict_chunk(start) for start in starts]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            chunks = list(pool.map(predict_chunk, starts))
+    return np.concatenate(chunks) if len(chunks) > 1 else np.asarray(chunks[0])
+
+def unique_rows(df: pd.DataFrame, features, max_unique_ratio=DEFAULT_DEDUP_MAX_RATIO):
+    """
+    (first, inverse) of the distinct rows of df[features]: the df position of each distinct
+    feature vector, and for every row the index of its vector in first. None when more than
+    max_unique_ratio of the rows are distinct, where deduplicating saves nothing.
+
+    Each column is factorized (NaN is a value of its own) and the codes are combined into
+    one integer row key, compacted again whenever the key space outgrows the row limit.
+    """
+    limit = max_unique_ratio * len(df)
+    if not len(df):
+        return None
+
+    key = np.zeros(len(df), dtype=np.int64)
+    size = 1
+    for feature in features:
+        codes, uniques = pd.factorize(df[feature])
+        if len(uniques) > limit:
+            return None
+        key = key * (len(uniques) + 1) + (codes + 1)
+        size *= len(uniques) + 1
+        if size > limit:
+            key, distinct = pd.factorize(key)
+            size = len(distinct)
+            if size > limit:
+                return None
+
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    return first, inverse
+
+def predict_unique(model, df: pd.DataFrame, features, chunk_rows=DEFAULT_PREDICT_CHUNK_ROWS, max_workers=None,
+                   max_unique_ratio=DEFAULT_DEDUP_MAX_RATIO) -> tuple[np.ndarray, dict]:
+    """
+    predict_chunked on the distinct feature rows only, scattered back to every row, and the
+    stats of the dedupe. Falls back to predicting every row when the features are continuous.
+    """
+    start = time.perf_counter()
+    rows = unique_rows(df, features, max_unique_ratio)
+    if rows is None:
+        predictions = predict_chunked(model, df, features, chunk_rows, max_workers)
+        distinct, seconds_saved = len(df), 0.0
+    else:
+        first, inverse = rows
+        predict_start = time.perf_counter()
+        predictions = predict_chunked(model, df.iloc[first], features, chunk_rows, max_workers)
+        # the skipped rows at the measured cost per predicted row
+        distinct = len(first)
+        seconds_saved = (time.perf_counter() - predict_start) / distinct * (len(df) - distinct)
+        predictions = predictions[inverse]
+
+    stats = {
+        'rows': len(df),
+        'predicted_rows': distinct,
+        'dedupe_ratio': len(df) / max(distinct, 1),
+        'seconds': time.perf_counter() - start,
+        'seconds_saved': seconds_saved,
     }
-    
+    logging.debug(
+        "Predicted %d of %d feature rows (%.1fx dedupe) in %.3fs, ~%.3fs saved",
+        distinct, len(df), stats['dedupe_ratio'], stats['seconds'], stats['seconds_saved'],
+    )
+    return predictions, stats
+
+def apply_ml_predictions(new_df, model, features, chunk_rows=DEFAULT_PREDICT_CHUNK_ROWS, max_workers=None):
+    # features: the feature list used during training
+    predictions, new_df.attrs['prediction_stats'] = predict_unique(model, new_df, features, chunk_rows, max_workers)
+
     new_df['Prediction_Code'] = predictions
-    new_df['Prediction_Label'] = [label_mapping.get(p, "Unknown") for p in predictions]
+    # model classes to registry codes (labels.MODEL_LABELS), "Unknown" for any other class
+    prediction_codes = model_label_codes(predictions)
+    new_df['Prediction_Label'] = issue_labels(prediction_codes)
 
-    new_df['Final_Label'] = new_df.apply(lambda row: row['Trend_Flag'] if row['Sustained_Issue'] else row['Prediction_Label'], axis=1)
+    new_df['Final_Label'] = issue_labels(
+        np.where(new_df['Sustained_Issue'], issue_codes(new_df['Trend_Flag']), prediction_codes)
+    )
 
     return new_df
 
-def run_predictions_and_summary(new_df, features, model, core_columns):
+def run_predictions_and_summary(new_df, features, model, core_columns, max_workers=None):
     # Apply ML predictions and combine with rule-based flags
     
     flagged = new_df[new_df['Sustained_Issue']]
-    new_df = apply_ml_predictions(new_df, model, features)
+    new_df = apply_ml_predictions(new_df, model, features, max_workers=max_workers)
     
-    # Accuracy and confusion matrix
-    y_true = new_df['Trend_Flag']
-    y_pred = new_df['Final_Label']
+    # Accuracy and confusion matrix, on the registry codes (ordered like the label text)
+    y_true = issue_codes(new_df['Trend_Flag'])
+    y_pred = issue_codes(new_df['Final_Label'])
     accuracy = round((accuracy_score(y_true, y_pred) * 100), 2)
     cm = confusion_matrix(y_true, y_pred)
     
@@ -56,174 +138,69 @@ def run_predictions_and_summary(new_df, features, model, core_columns):
         'new_df': new_df
     }
 
-def set_gunshot_conditions(df: pd.DataFrame) -> dict[str, bool]:
-    # Condition 1: 1st stage hot sump issue
-    condition_1 = (
-        (get_column_safe(df, 'TC8') >= 69)  # 1st sump line
-    )
-    
-    # Condition 7: 2nd stage hot sump issue
-    condition_7 = (
-        (get_column_safe(df, 'TC9') >= 69)  # 2nd sump line
-    )
-    
-    # Condition 14: Intermittent Fan Issue
-    condition_14 = (
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &        # RTD
-        (get_column_safe(df, 'TC7_trend') > 0) &        # liquid line
-        (get_column_safe(df, 'TC2_trend') > 0) &        # Air inlet
-        (get_column_safe(df, 'Diff_TC2_&_TC7') > 10) # Check if the absolute difference between TC2 and TC7 is lesser than 10
-    )
-    
-    # dictionary for gun shot events
-    gun_shot_events = {
-        "1st stage hot sump": condition_1,
-        "2nd stage hot sump": condition_7,
-        "Intermittent Fan Issue": condition_14
-    }
-    
-    return gun_shot_events #type: ignore
-
-def set_firstStage_conditions(df: pd.DataFrame) -> dict[str, bool]:
-    # Condition 5: 1st stage leak issue
-    condition_5 = (
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != -127) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 127) &
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        (get_column_safe(df, 'TC10_trend') > 0) &
-        (get_column_safe(df, 'TC1_trend') > 0) &
-        (get_column_safe(df, 'TC8_trend') > 0)
-    )
-    
-    # Condition 4: 1st stage issue
-    condition_4 = ( 
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != -127) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 127) & # Check if TC3 and TC4 are not both zero
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        (get_column_safe(df, 'TC10_trend') > 0) |
-        (get_column_safe(df, 'TC1_trend') > 0)  # First check: if TC1_trend > 0, the condition is satisfied
-    )
-    
-    # Condition 3: 1st stage compression failure
-    condition_3 = (
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != -127) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 127) &  # Check if TC3 and TC4 are not both zero
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &    #RTD
-        (get_column_safe(df, 'TC10_trend') > 0) &  # BPHX
-        (get_column_safe(df, 'PUC_State') == 1) |
-        (get_column_safe(df, 'TC1_trend') > 0) # First check: if TC1_trend > 0, the condition is satisfied
-    )
-    
-    # Condition 2: 1st stage compressor start components issue
-    condition_2 = (
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        (get_column_safe(df, 'TC_zigzag') == True) &
-        (get_column_safe(df, 'TC10_trend') > 0) &
-        (get_column_safe(df, 'TC1_trend') > 0) &
-        (get_column_safe(df, 'TC1') >= 70)
-    )
-    
-    first_stage_events = {
-        "1st stage leak issue": condition_5,
-        "1st stage issue": condition_4,
-        "1st stage compression issue": condition_3,
-        "1st stage compressor start components issue": condition_2,
-    }
-    
-    return first_stage_events
-
-def set_secondStage_conditions(df: pd.DataFrame) -> dict[str, bool]:
-    # Condition 11: 2nd stage leak issue
-    condition_11 = (
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != -127) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 127) &
-        (get_column_safe(df, 'TC3_trend') < 0) &
-        (get_column_safe(df, 'TC4_trend') > 0) &
-        (get_column_safe(df, 'TC6_trend') > 0) &
-        (get_column_safe(df, 'TC10_trend') < 0) &
-        (get_column_safe(df, 'TC1_trend') < 0) &
-        (abs(df['TC3'] - df['TC4']) > 5)   # Check if the absolute difference between TC3 and TC4 is greater than 5
-    )
-    
-    # Condition 10: 2nd stage issue
-    condition_10 = (
-        (get_column_safe(df, 'RTD_in_range') == False) &                                                 
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != -127) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 127) &
-        (get_column_safe(df, 'TC10_trend') < 0)|
-        (get_column_safe(df, 'TC6_trend') > 0) 
-    )
-    
-    # Condition 9: 2nd stage compression failure
-    condition_9 = (
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != -127) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 127) &
-        (get_column_safe(df, 'TC10_trend') < 0) &
-        (get_column_safe(df, 'TC3_trend') > 0) &
-        (get_column_safe(df, 'TC4_trend') > 0) &
-        (get_column_safe(df, 'TC1_trend') < 0)
-    )
-    
-    # Condition 8: 2nd stage compressor Start components issue
-    condition_8 = (
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        (get_column_safe(df, 'TC_zigzag') == True) &
-        (get_column_safe(df, 'TC10_trend') < 0) &
-        (get_column_safe(df, 'TC1_trend') < 0) 
-    )
+# STP rules in priority order: the first rule matching a row sets its Trend_Flag
+STP_RULES = [
+    Rule(DOOR_IGNORED_FLAG, 'door', [[('Door_Status', '==', -1)]]),
 
-    # Condition 12: 2nd stage insulation issue (Armaflex)
-    condition_12 = (
-        (get_column_safe(df, 'RTD_in_range') == False) &
-        (get_column_safe(df, 'RTD_trend') > 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 0) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != -127) &
-        ((df[['TC3', 'TC4']].mean(axis=1)) != 127) &
-        (get_column_safe(df, 'TC3_in_range') == True) &
-        (get_column_safe(df, 'TC4_trend') > 0) &
-        (get_column_safe(df, 'TC1_in_range') == True) &
-        (get_column_safe(df, 'TC10_in_range') == True)  
-    )
+    # gun shot events, checked first because of higher priority
+    Rule("1st stage hot sump", 'gun_shot', [[('TC8', '>=', 69)]]),    # 1st sump line
+    Rule("2nd stage hot sump", 'gun_shot', [[('TC9', '>=', 69)]]),    # 2nd sump line
+    Rule("Intermittent Fan Issue", 'gun_shot', [[
+        *RTD_WARMING,
+        ('TC7_trend', '>', 0),          # liquid line
+        ('TC2_trend', '>', 0),          # Air inlet
+        ('Diff_TC2_&_TC7', '>', 10)
+    ]]),
 
-    #  Condition 15: VIP Panel Issues
-    # condition_15 = (
-    #     (get_column_safe(df, 'RTD_in_range') == False) &
-    #     (get_column_safe(df, 'RTD_trend') > 0) &
-    #     (get_column_safe(df, 'TC3_trend') > 0) &
-    #     (get_column_safe(df, 'TC4_trend') > 0) 
-    # )
-    
-    second_stage_events = {
-        "2nd stage leak issue": condition_11,
-        "2nd stage issue": condition_10,
-        "2nd stage compression issue": condition_9,
-        "2nd stage compressor start components issue": condition_8,
-        "2nd stage insulation issue (Armaflex)": condition_12
-    }
-    
-    return second_stage_events
+    # first stage, only while TC10 is warming
+    Rule("1st stage leak issue", 'first_stage', [[
+        *TC3_TC4_CONNECTED, *RTD_WARMING,
+        ('TC10_trend', '>', 0), ('TC1_trend', '>', 0), ('TC8_trend', '>', 0)
+    ]]),
+    Rule("1st stage issue", 'first_stage', [
+        [*TC3_TC4_CONNECTED, *RTD_WARMING, ('TC10_trend', '>', 0)],
+        [('TC1_trend', '>', 0)]
+    ]),
+    Rule("1st stage compression issue", 'first_stage', [
+        [*TC3_TC4_CONNECTED, *RTD_WARMING, ('TC10_trend', '>', 0), ('PUC_State', '==', 1)],
+        [('TC1_trend', '>', 0)]
+    ]),
+    Rule("1st stage compressor start components issue", 'first_stage', [[
+        *RTD_WARMING, ('TC_zigzag', '==', True),
+        ('TC10_trend', '>', 0), ('TC1_trend', '>', 0), ('TC1', '>=', 70)
+    ]]),
+
+    # second stage, only while TC10 is cooling
+    Rule("2nd stage leak issue", 'second_stage', [[
+        *RTD_WARMING, *TC3_TC4_CONNECTED,
+        ('TC3_trend', '<', 0), ('TC4_trend', '>', 0), ('TC6_trend', '>', 0),
+        ('TC10_trend', '<', 0), ('TC1_trend', '<', 0),
+        ('abs(TC3 - TC4)', '>', 5)
+    ]]),
+    Rule("2nd stage issue", 'second_stage', [
+        [*RTD_WARMING, *TC3_TC4_CONNECTED, ('TC10_trend', '<', 0)],
+        [('TC6_trend', '>', 0)]
+    ]),
+    Rule("2nd stage compression issue", 'second_stage', [[
+        *RTD_WARMING, *TC3_TC4_CONNECTED,
+        ('TC10_trend', '<', 0), ('TC3_trend', '>', 0), ('TC4_trend', '>', 0), ('TC1_trend', '<', 0)
+    ]]),
+    Rule("2nd stage compressor start components issue", 'second_stage', [[
+        *RTD_WARMING, ('TC_zigzag', '==', True), ('TC10_trend', '<', 0), ('TC1_trend', '<', 0)
+    ]]),
+    Rule("2nd stage insulation issue (Armaflex)", 'second_stage', [[
+        *RTD_WARMING, *TC3_TC4_CONNECTED,
+        ('TC3_in_range', '==', True), ('TC4_trend', '>', 0),
+        ('TC1_in_range', '==', True), ('TC10_in_range', '==', True)
+    ]]),
+    # VIP Panel Issues: RTD warming with TC3_trend > 0 and TC4_trend > 0, not enabled
+]
+STP_PLAN = compile_rules(STP_RULES)
 
 # conditions
 def is_zigzag(trends):
-    # Convert trends to direction: 1 (up), -1 (down), 0 (flat)
-    directions = np.sign(trends)
+    # Convert trends to direction: 1 (up), -1 (down), 0 (flat), by position
+    directions = np.sign(np.asarray(trends))
     
     # Remove 0s (flat values) to focus on actual changes
     directions = directions[directions != 0]
@@ -235,120 +212,110 @@ def is_zigzag(trends):
     # Check for alternation in directions
     return all(directions[i] != directions[i+1] for i in range(len(directions)-1))
 
-def flag_sustained(df: pd.DataFrame, col='Trend_Flag', file_type=None, min_consecutive=None):
+def zigzag_rows(trends: np.ndarray) -> np.ndarray:
     """
-    Flags sustained issues in the DataFrame. If file_type is 'STP' or 'STP1', min_consecutive=45, else 180.
+    is_zigzag for every row of a rows x channels trend matrix at once: the non-zero
+    directions of a row alternate, and there are at least two of them.
     """
-    if file_type in ('STP', 'STP1'):
-        min_consecutive = 45    
-    else:
-        min_consecutive = 180 if min_consecutive is None else min_consecutive
-    ignore = [
-        'No issue detected - your device is working properly',
-        'Door Open Event, Ignored'
-    ]
-    labels = [False] * len(df)   # final column (default False)
-    current_flag = None
-    count = 0
-    
-    for i, val in enumerate(df[col]):
-        if val in ignore:
-            current_flag = None
-            count = 0
-            continue
-        
-        if val == current_flag:
-            count += 1
+    directions = np.sign(trends)
+    rows, channels = directions.shape
+    nonzero = directions != 0
+
+    # position of the last non-zero direction up to each column (forward fill), -1 if none yet
+    positions = np.where(nonzero, np.arange(channels), -1)
+    last = np.maximum.accumulate(positions, axis=1)
+
+    # the non-zero direction before each column, compared where the column itself is non-zero
+    previous = np.full((rows, channels), -1, dtype=last.dtype)
+    previous[:, 1:] = last[:, :-1]
+    previous_direction = np.take_along_axis(directions, np.maximum(previous, 0), axis=1)
+    repeated = nonzero & (previous >= 0) & (directions == previous_direction)
+
+    return (nonzero.sum(axis=1) >= 2) & ~repeated.any(axis=1)
+
+@dataclass
+class Runs:
+    """Maximal runs of equal consecutive values, as parallel arrays."""
+    starts: np.ndarray
+    lengths: np.ndarray
+    values: np.ndarray
+    durations: np.ndarray | None = None  # last minus first timestamp of each run, NaT if it has none
+
+def run_lengths(values, times=None) -> Runs:
+    """
+    Run-length encode values in one pass. With times (datetime64, same length) each run
+    also gets the span between its earliest and latest timestamp, NaT ignored.
+    """
+    values = np.asarray(values)
+    n = len(values)
+    change = np.ones(n, dtype=bool)
+    change[1:] = values[1:] != values[:-1]
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, n))
+    runs = Runs(starts, lengths, values[starts])
+
+    if times is not None:
+        times = np.asarray(times, dtype='datetime64[ns]')
+        stamps, missing = times.view('int64'), np.isnat(times)
+        if n:
+            latest = np.maximum.reduceat(np.where(missing, np.iinfo(np.int64).min, stamps), starts)
+            earliest = np.minimum.reduceat(np.where(missing, np.iinfo(np.int64).max, stamps), starts)
+            empty = np.logical_and.reduceat(missing, starts)
+            runs.durations = np.where(empty, np.timedelta64('NaT'), (latest - earliest).astype('timedelta64[ns]'))
         else:
-            current_flag = val
-            count = 1
-        
-        if count >= min_consecutive:
-            # mark all sustained entries as True
-            for j in range(i - min_consecutive + 1, i + 1):
-                labels[j] = True
-    
-    return labels
+            runs.durations = np.array([], dtype='timedelta64[ns]')
+    return runs
 
+def sustained_window(file_type=None, min_consecutive=None) -> int:
+    # rows a run of flags needs to be sustained: 45 for STP / STP1, else min_consecutive or 180
+    if file_type in ('STP', 'STP1'):
+        return 45
+    return 180 if min_consecutive is None else min_consecutive
 
+def flag_sustained(df: pd.DataFrame, col='Trend_Flag', file_type=None, min_consecutive=None) -> np.ndarray:
+    """
+    Flags sustained issues in the DataFrame. If file_type is 'STP' or 'STP1', min_consecutive=45, else 180.
+    A row is sustained when its run of identical flags is at least min_consecutive long.
+    """
+    min_consecutive = sustained_window(file_type, min_consecutive)
+    # runs of the label codes; the no-issue labels and missing ones never count
+    codes, categories = factorize_labels(df[col])
+    runs = run_lengths(codes)
+    sustained = (runs.lengths >= min_consecutive) & ~np.isin(runs.values, not_issue_codes(categories))
+    return np.repeat(sustained, runs.lengths)
 
 def get_column_safe(new_df: pd.DataFrame, column_name, default_value=0):
     return new_df[column_name] if column_name in new_df.columns else default_value
 
 def is_sustained(df: pd.DataFrame, condition, min_duration=45) -> bool:
     """Check if a condition is sustained for at least min_duration minutes."""
-    df = df.copy()
-    
-    df['condition_met'] = condition
-    
-    df['group'] = (df['condition_met'] != df['condition_met'].shift()).cumsum()
-    
-    sustained_groups = df[df['condition_met']].groupby('group').apply(
-        lambda x: (x['Date/Time'].max() - x['Date/Time'].min()).total_seconds() / 60 > min_duration
-    )
-    sustained = df['group'].isin(sustained_groups[sustained_groups].index)
-        
-    return sustained.any()
+    condition = np.broadcast_to(np.asarray(condition, dtype=bool), (len(df),))
+    runs = run_lengths(condition, df['Date/Time'].to_numpy())
+    minutes = runs.durations[runs.values] / np.timedelta64(1, 's') / 60
+    return bool((minutes > min_duration).any())
 
 def set_flag_conditions(df: pd.DataFrame):
     # Dynamically select all columns that end with '_trend'
-    tc_trend_cols = [col for col in df.filter(regex='_trend$').columns if df[col].mean() != 0]
+    trend_cols = list(df.filter(regex='_trend$').columns)
+    profile = column_profile(df, trend_cols)
+    tc_trend_cols = [col for col in trend_cols if profile.mean(col) != 0]
     
-    # Apply zigzag condition row-wise output will be True or false
-    df['TC_zigzag'] = df[tc_trend_cols].apply(is_zigzag, axis=1)
+    from .sharding import flag_rows  # sharding imports this module for its kernels
+
+    # Zigzag condition for all rows at once (set as TC_zigzag, output will be True or false), then
+    # door events, gun shot events, then the first / second stage rules while TC10 is warming / cooling,
+    # in time shards on worker processes for a long export
+    trend_flag, sustained = flag_rows(STP_PLAN, df, tc_trend_cols)
     
     # calculating TC10 trend class: 0 -> normal, 1 -> warming, -1 -> cooling
     df['TC10_trend_class'] = np.where(
         get_column_safe(df, 'TC10') > -35, 1,
         np.where(get_column_safe(df, 'TC10') < -45, -1, 0)
-    )
+    ).astype(np.int8)
 
-    # fetching gun shot events and their coniditions
-    gun_shot = set_gunshot_conditions(df)
-    first_stage = set_firstStage_conditions(df)
-    second_stage = set_secondStage_conditions(df)
-    
-    # variable for default values in trend flag sets
-    default_val = "No issue detected - your device is working properly"
-    
-    # setting df for gun shot events first because of higher priority
-    df['Trend_Flag'] = np.where(
-        df['Door_Status'] != -1,
-        np.select(
-            [condition for condition in gun_shot.values()],
-            [key for key in gun_shot],
-            default = default_val
-        ),
-        "Door Open Event, Ignored"
-    )
-    
-    # Sustained conditions for TC10
-    sustained_warming = is_sustained(df, get_column_safe(df, 'TC10') > -35)
-    sustained_cooling = is_sustained(df, get_column_safe(df, 'TC10') < -45)
+    df['Trend_Flag'] = trend_flag
     
-    if sustained_warming:
-        df['Trend_Flag'] = np.where(
-            df['Trend_Flag'] == default_val,
-            np.select(
-                [condition for condition in first_stage.values()],
-                [key for key in first_stage],
-                default=default_val
-            ),
-            df['Trend_Flag']
-        )
-    
-    if sustained_cooling:
-        df['Trend_Flag'] = np.where(
-            df['Trend_Flag'] == default_val,
-            np.select(
-                [condition for condition in second_stage.values()],
-                [key for key in second_stage],
-                default=default_val
-            ),
-            df['Trend_Flag']
-        )
-    
-    df['Sustained_Issue'] = flag_sustained(df)
+    df['Sustained_Issue'] = sustained
     df['Issue_Detected'] = df['Sustained_Issue'].astype(int)
 
     # calculate final label based on sustained issues
@@ -358,12 +325,8 @@ def set_flag_conditions(df: pd.DataFrame):
 
 
 def final_label_prediction(df: pd.DataFrame) -> pd.DataFrame:
-    final_labels = []
-    for trend, sustained in zip(df['Trend_Flag'], df['Sustained_Issue']):
-        if sustained:
-            final_labels.append(trend)   # keep the sustained issue name
-        else:
-            final_labels.append("No issue detected")  # replace everything else
-    
-    df['Final_Label'] = final_labels
+    # keep the sustained issue name, replace everything else
+    df['Final_Label'] = issue_labels(
+        np.where(df['Sustained_Issue'], issue_codes(df['Trend_Flag']), label_codes([NO_ISSUE_FLAG])[0])
+    )
     return df
\ No newline at end of file
@@ -1,14 +1,281 @@
+import os
+import mmap
 import pandas as pd
 import numpy as np
-from io import StringIO
+from io import BytesIO
 from datetime import datetime
 from collections import defaultdict
+from dataclasses import dataclass, field, asdict
+from pandas.tseries.api import guess_datetime_format
+
+from .tracing import span
+from .stages import submit, resolve
+
+# markers of the event lines interleaved with the telemetry rows of a PUC export
+DOOR_EVENTS = ("Door Open Event", "Door Close Event")
+POWER_EVENTS = ("Power Glitch", "Power Failure Alarm")
+REFRIGERATION_EVENT = "System Refrigeration Failure Alarm"
+
+# bytes scanned per step (read from a stream, or a window of a buffer / mmap), and raw
+# telemetry text held before it is parsed into typed column arrays; the budget bounds
+# ingest memory, not the frame
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_MEMORY_BUDGET = 64 << 20
+
+# positional columns of the telemetry rows in a PUC export
+PUC_COLUMNS = [
+    "Date/Time", "RTD", "TC1", "TC2", "TC3", "TC4", "TC6", 
+    "TC7", "TC9", "TC10", "Setpoint", "Voltage", "PUC_State", "User Offset", 
+    "Warm Warning setpoint", "Cold Warning setpoint", "Stage 1 RPM", "Stage 2 RPM", 
+    "HxHxRec", "Fan State", "VscRefStageMSB", "VscRefStageLSB", "BUS RTD", 
+    "RSSI", "latency", "TC8"
+]
+
+# compact dtypes the telemetry columns are loaded as; an integer column that holds
+# NaNs, fractions or out-of-range values falls back to float32
+TELEMETRY_DTYPES = {
+    "RTD": "float32", "TC1": "float32", "TC2": "float32", "TC3": "float32",
+    "TC4": "float32", "TC6": "float32", "TC7": "float32", "TC8": "float32",
+    "TC9": "float32", "TC10": "float32", "BUS RTD": "float32",
+    "Setpoint": "float32", "User Offset": "float32", "Voltage": "float32",
+    "Warm Warning setpoint": "float32", "Cold Warning setpoint": "float32",
+    "PUC_State": "int8", "Fan State": "int8", "HxHxRec": "int8", "RSSI": "int8",
+    "Stage 1 RPM": "int16", "Stage 2 RPM": "int16",
+    "VscRefStageMSB": "int16", "VscRefStageLSB": "int16", "latency": "int16"
+}
+
+def _compact(values: pd.Series, dtype: str) -> pd.Series:
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return values
+    if dtype.startswith("int"):
+        info = np.iinfo(dtype)
+        array = values.to_numpy(dtype=float)
+        if (np.isfinite(array).all() and (array == np.round(array)).all()
+                and (array.size == 0 or (array.min() >= info.min and array.max() <= info.max))):
+            return values.astype(dtype)
+        dtype = "float32"
+    return values.astype(dtype)
+
+def apply_telemetry_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the known telemetry columns of df to TELEMETRY_DTYPES, in place."""
+    columns = [col for col in TELEMETRY_DTYPES if col in df.columns]
+    for col in columns:
+        df[col] = _compact(df[col], TELEMETRY_DTYPES[col])
+    forget_column_stats(df, columns)
+    return df
 
-# remove door and power events
-def parse_timestamp(timestamp_str):
-    timestamp_str = timestamp_str.strip().rstrip(',')
+def bytes_per_row(df: pd.DataFrame) -> float:
+    return float(df.memory_usage(index=False, deep=True).sum()) / max(len(df), 1)
+
+_EVENT_MARKERS = tuple(marker.encode() for marker in DOOR_EVENTS + POWER_EVENTS + (REFRIGERATION_EVENT,))
+
+def _find_all(data: bytes, needle: bytes, start: int, end: int) -> list[int]:
+    positions = []
+    pos = data.find(needle, start, end)
+    while pos != -1:
+        positions.append(pos)
+        pos = data.find(needle, pos + 1, end)
+    return positions
+
+@dataclass
+class PucScan:
+    """Lines of a PUC export sorted into streams by scan_puc_data."""
+    csv_chunks: list[bytes] = field(default_factory=list)
+    door_lines: list[str] = field(default_factory=list)
+    power_lines: list[str] = field(default_factory=list)
+    ref_lines: list[str] = field(default_factory=list)
+    malformed_lines: list[bytes] = field(default_factory=list)
+    counts: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    expected_col_count: int | None = None
+    memory_budget: int | None = None
+    column_buffers: dict[int, list[np.ndarray]] = field(default_factory=dict)
+    _tail: bytes = b''
+    _pending: int = 0
+    _datetime_format: str | None = None
+    _loaded_nbytes: int = 0
+
+    def feed(self, data: bytes) -> None:
+        """Scan the next piece of an export. A trailing partial line waits for the next call."""
+        if self._tail:
+            data = self._tail + data
+        cut = data.rfind(b'\n') + 1
+        self._tail = data[cut:]
+        if cut:
+            self._scan_block(data, 0, cut, final=False)
+
+    def feed_buffer(self, data, chunk_size=DEFAULT_CHUNK_SIZE) -> None:
+        """
+        Scan a complete export held in bytes or an mmap, in line-aligned windows of
+        about chunk_size bytes that are read in place. Only the last line is copied.
+        """
+        pos, size = 0, len(data)
+        while pos < size:
+            cut = data.rfind(b'\n', pos, pos + chunk_size) + 1
+            if cut <= pos:
+                # a line longer than the window
+                cut = data.find(b'\n', pos + chunk_size) + 1
+                if not cut:
+                    break
+            self._scan_block(data, pos, cut, final=False)
+            pos = cut
+        self.feed(data[pos:])
+
+    def close(self) -> None:
+        """Scan whatever follows the last newline, an empty last line included."""
+        tail, self._tail = self._tail, b''
+        self._scan_block(tail, 0, len(tail), final=True)
+
+    def _scan_block(self, data, start: int, end: int, final: bool) -> None:
+        # data[start:end] holds whole lines; every byte is looked at once by the numpy
+        # passes for newlines/commas and the bytes.find passes for the markers.
+        # Positions below are absolute offsets into data.
+        buf = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+        newlines = np.flatnonzero(buf == ord('\n')) + start
+        starts = np.concatenate(([start], newlines + 1))
+        ends = np.append(newlines, end)
+        if not final:
+            starts, ends = starts[:-1], ends[:-1]
+        n_lines = len(starts)
+
+        commas = np.flatnonzero(buf == ord(','))
+        col_counts = np.diff(np.searchsorted(commas + start, ends), prepend=0) + 1
+
+        is_header = np.zeros(n_lines, dtype=bool)
+        header_pos = np.array(_find_all(data, b'PUC_VER', start, end), dtype=np.int64)
+        if header_pos.size:
+            header_idx = np.searchsorted(newlines, header_pos)
+            is_header[header_idx[starts[header_idx] == header_pos]] = True
+
+        # the first non-header line fixes the column count of the telemetry rows
+        if self.expected_col_count is None and not is_header.all():
+            self.expected_col_count = int(col_counts[np.argmin(is_header)])
+        is_csv = (col_counts == self.expected_col_count) & ~is_header
+
+        is_event = np.zeros(n_lines, dtype=bool)
+        for marker in _EVENT_MARKERS:
+            is_event[np.searchsorted(newlines, _find_all(data, marker, start, end))] = True
+        is_event &= ~is_header
+
+        # only the rare event and malformed lines are handled one at a time
+        for i in np.flatnonzero(is_event):
+            self._add_event(data[starts[i]:ends[i]].decode('utf-8').strip())
+        for i in np.flatnonzero(~(is_csv | is_header | is_event)):
+            line = data[starts[i]:ends[i]]
+            if line.strip():
+                self.malformed_lines.append(line)
+                self.counts['malformed'] += 1
+            else:
+                self.counts['blank'] += 1
+
+        # keep the telemetry rows as runs of bytes between the excluded lines
+        offset = start
+        for i in np.flatnonzero(~is_csv):
+            if starts[i] > offset:
+                self.csv_chunks.append(data[offset:starts[i]])
+                self._pending += starts[i] - offset
+            offset = ends[i] + 1
+        if offset < end:
+            self.csv_chunks.append(data[offset:end])
+            self._pending += end - offset
+        if self.memory_budget is not None and self._pending >= self.memory_budget:
+            self._flush_csv()
+
+        self.counts['total'] += n_lines
+        self.counts['header'] += int(is_header.sum())
+        self.counts['csv'] += int(is_csv.sum())
+
+    def _add_event(self, text: str) -> None:
+        if any(event in text for event in DOOR_EVENTS):
+            self.door_lines.append(text)
+            self.counts['door'] += 1
+        if any(event in text for event in POWER_EVENTS):
+            self.power_lines.append(text)
+            self.counts['power'] += 1
+        if REFRIGERATION_EVENT in text:
+            self.ref_lines.append(text)
+            self.counts['refrigeration'] += 1
+
+    @property
+    def has_data(self) -> bool:
+        return self.expected_col_count is not None
+
+    def _flush_csv(self) -> None:
+        """Parse the pending telemetry rows into typed column arrays and drop their text."""
+        if not self.csv_chunks:
+            return
+        batch = pd.read_csv(BytesIO(b"".join(self.csv_chunks)), header=None)
+        self.csv_chunks.clear()
+        self._pending = 0
+
+        # same inference as a whole-column to_datetime: the first value fixes the format
+        if self._datetime_format is None:
+            first = batch[0].dropna()
+            if not first.empty:
+                self._datetime_format = guess_datetime_format(str(first.iloc[0]))
+        batch[0] = pd.to_datetime(batch[0], format=self._datetime_format, errors='coerce')
+
+        # size with read_csv's float64/int64 columns, kept for the bytes per row report
+        self._loaded_nbytes += int(batch.memory_usage(index=False, deep=True).sum())
+        batch.columns = PUC_COLUMNS[:batch.shape[1]]
+        apply_telemetry_dtypes(batch)
+
+        for col in range(batch.shape[1]):
+            self.column_buffers.setdefault(col, []).append(batch.iloc[:, col].to_numpy())
+
+    def telemetry_frame(self) -> pd.DataFrame:
+        """Assemble the telemetry rows, releasing the column buffers as it goes."""
+        self._flush_csv()
+        if not self.column_buffers:
+            # nothing but empty rows, fail the way read_csv does
+            return pd.read_csv(BytesIO(b""), header=None)
+
+        frame = {}
+        for col in list(self.column_buffers):
+            parts = self.column_buffers.pop(col)
+            frame[col] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return pd.DataFrame(frame)
+
+# Ingest sources: each one feeds a PucScan, and everything downstream of the scan is shared
+def scan_puc_data(raw_data, chunk_size=DEFAULT_CHUNK_SIZE, memory_budget=DEFAULT_MEMORY_BUDGET) -> PucScan:
+    """
+    Walk a PUC export once and sort every line into the telemetry CSV rows,
+    the door / power / refrigeration-failure event streams or the malformed lines.
+    """
+    if isinstance(raw_data, str):
+        raw_data = raw_data.encode('utf-8')
+
+    scan = PucScan(memory_budget=memory_budget)
+    scan.feed_buffer(raw_data, chunk_size)
+    scan.close()
+    return scan
+
+def scan_puc_stream(stream, chunk_size=DEFAULT_CHUNK_SIZE, memory_budget=DEFAULT_MEMORY_BUDGET) -> PucScan:
+    """
+    Scan a binary stream (e.g. an upload) in fixed-size chunks. Telemetry rows are
+    parsed into typed column arrays whenever their text reaches memory_budget bytes.
+    """
+    scan = PucScan(memory_budget=memory_budget)
+    while chunk := stream.read(chunk_size):
+        scan.feed(chunk)
+    scan.close()
+    return scan
+
+def scan_puc_path(path, chunk_size=DEFAULT_CHUNK_SIZE, memory_budget=DEFAULT_MEMORY_BUDGET) -> PucScan:
+    """Scan a PUC export on disk straight from a read-only memory map of the file."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return scan_puc_data(b'', chunk_size, memory_budget)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return scan_puc_data(mapped, chunk_size, memory_budget)
+
+def _as_scan(raw_data) -> PucScan:
+    return raw_data if isinstance(raw_data, PucScan) else scan_puc_data(raw_data)
+
+# columns of the door events frame that hold parsed datetimes rather than display text
+DOOR_EVENT_TIME_COLUMNS = ['Open_dt', 'Close_dt']
 
-    formats = [
+# remove door and power events
+TIMESTAMP_FORMATS = [
     # MM/DD/YYYY (US)
     "%m/%d/%Y %I:%M:%S.%f %p",   # 12-hour with AM/PM and microseconds
     "%m/%d/%Y %I:%M:%S %p",      # 12-hour with AM/PM
@@ -63,9 +330,15 @@ def parse_timestamp(timestamp_str):
     "%Y-%m-%dT%H:%M:%S+05:30",    # ISO without microseconds and IST offset
     "%m/%d/%Y %H:%M:%S+05:30",    # US format with IST offset
     "%d/%m/%Y %H:%M:%S+05:30"     # International format with IST offset
-    ]
+]
 
-    for fmt in formats:
+# how many event timestamps are looked at to pick the format of a file
+TIMESTAMP_SAMPLE_SIZE = 64
+
+def parse_timestamp(timestamp_str):
+    timestamp_str = timestamp_str.strip().rstrip(',')
+
+    for fmt in TIMESTAMP_FORMATS:
         try:
             return datetime.strptime(timestamp_str, fmt)
         except ValueError:
@@ -73,154 +346,318 @@ def parse_timestamp(timestamp_str):
 
     return None
 
-def detect_power_events(raw_data) -> pd.DataFrame:
-    tracked_events = [
-        "Power Glitch",
-        "Power Failure Alarm"
-    ]
-    lines = raw_data.decode('utf-8').split('\n') if isinstance(raw_data, bytes) else raw_data.split('\n')
-    event_data = []
-    count_per_day_event = defaultdict(int)
-    raw_events = []
-    for line in lines:
-        line = line.strip()
-        if not line:
+def _to_naive(parsed: pd.Series) -> pd.Series:
+    # offsets are dropped the same way the old strftime round-trip dropped them
+    if getattr(parsed.dt, 'tz', None) is not None:
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+def infer_timestamp_format(timestamp_strs) -> str | None:
+    """
+    Pick the first entry of TIMESTAMP_FORMATS that parses every sampled timestamp,
+    or the one that parses the most of them. Returns None if nothing matches.
+    """
+    sample = pd.Series(list(timestamp_strs)[:TIMESTAMP_SAMPLE_SIZE], dtype=object)
+    if sample.empty:
+        return None
+    sample = sample.str.strip().str.rstrip(',')
+
+    best_fmt, best_hits = None, 0
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            hits = int(pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum())
+        except ValueError:
             continue
-        for event in tracked_events:
-            if event in line:
-                timestamp_str = line.split(event)[0].strip()
-                event_time = parse_timestamp(timestamp_str)
-                if event_time:
-                    event_date = event_time.strftime("%m/%d/%Y")
-                    time_str = event_time.strftime("%I:%M:%S %p")
-                    raw_events.append((event_date, event, time_str))
-                    count_per_day_event[(event_date, event)] += 1
-                break
-    for event_date, event, time_str in raw_events:
-        total_count = count_per_day_event[(event_date, event)]
-        event_data.append({
-            "Date of Event": event_date,
-            "Event": event,
-            "Total Events in Day": total_count,
-            "Time of Event": time_str
-        })
-    return pd.DataFrame(event_data)
+        if hits == len(sample):
+            return fmt
+        if hits > best_hits:
+            best_fmt, best_hits = fmt, hits
+
+    return best_fmt
+
+def parse_timestamps(timestamp_strs, timestamp_format=None) -> pd.Series:
+    """
+    Parse event timestamps in one vectorized call using the file's format
+    (inferred when not given). Only rows that fail it go through parse_timestamp.
+    """
+    cleaned = pd.Series(list(timestamp_strs), dtype=object).str.strip().str.rstrip(',')
+    if cleaned.empty:
+        return pd.Series([], dtype='datetime64[ns]')
 
-def detect_door_events(raw_data) -> pd.DataFrame:
-    lines = raw_data.decode('utf-8').split('\n') if isinstance(raw_data, bytes) else raw_data.split('\n')
-    data = []
+    if timestamp_format is None:
+        timestamp_format = infer_timestamp_format(cleaned)
+
+    parsed = pd.Series(pd.NaT, index=cleaned.index, dtype='datetime64[ns]')
+    if timestamp_format is not None:
+        try:
+            parsed = _to_naive(pd.to_datetime(cleaned, format=timestamp_format, errors='coerce'))
+        except ValueError:
+            # e.g. mixed utc offsets under a %z format, leave it to the fallback
+            pass
+
+    failed = parsed.isna()
+    if failed.any():
+        fallback = [parse_timestamp(ts) for ts in cleaned[failed]]
+        parsed[failed] = [
+            pd.NaT if ts is None else ts.replace(tzinfo=None) for ts in fallback
+        ]
+
+    return parsed
+
+def _event_timestamp_strs(lines, markers) -> tuple[list[str], list[str]]:
+    # text in front of the first marker found on each line, and that marker
+    timestamps, found = [], []
+    for line in lines:
+        for marker in markers:
+            if marker in line:
+                timestamps.append(line.split(marker)[0])
+                found.append(marker)
+                break
+    return timestamps, found
+
+def _ref_timestamp_strs(lines) -> list[str]:
+    return [line.split(',')[0] for line in lines if REFRIGERATION_EVENT in line]
+
+def infer_scan_timestamp_format(scan: PucScan) -> str | None:
+    """Infer the timestamp format of a file from a sample of all its event lines."""
+    sample = _event_timestamp_strs(scan.door_lines[:TIMESTAMP_SAMPLE_SIZE], DOOR_EVENTS)[0]
+    sample += _event_timestamp_strs(scan.power_lines[:TIMESTAMP_SAMPLE_SIZE], POWER_EVENTS)[0]
+    sample += _ref_timestamp_strs(scan.ref_lines[:TIMESTAMP_SAMPLE_SIZE])
+    return infer_timestamp_format(sample)
+
+def detect_power_events(raw_data, timestamp_format=None) -> pd.DataFrame:
+    timestamp_strs, events = _event_timestamp_strs(_as_scan(raw_data).power_lines, POWER_EVENTS)
+    event_times = parse_timestamps(timestamp_strs, timestamp_format)
+
+    power_df = pd.DataFrame({"Event": events, "event_time": event_times})
+    power_df = power_df.dropna(subset=["event_time"]).reset_index(drop=True)
+    if power_df.empty:
+        return pd.DataFrame()
+
+    event_date = power_df["event_time"].dt.strftime("%m/%d/%Y")
+    return pd.DataFrame({
+        "Date of Event": event_date,
+        "Event": power_df["Event"],
+        "Total Events in Day": power_df.groupby([event_date, power_df["Event"]])["Event"].transform("size"),
+        "Time of Event": power_df["event_time"].dt.strftime("%I:%M:%S %p")
+    })
+
+def detect_door_events(raw_data, timestamp_format=None) -> pd.DataFrame:
+    timestamp_strs, markers = _event_timestamp_strs(_as_scan(raw_data).door_lines, DOOR_EVENTS)
+    event_times = parse_timestamps(timestamp_strs, timestamp_format).to_numpy()
+
+    open_times, close_times, open_counts = [], [], []
     door_open_time = None
     door_open_date = None
     door_open_count = {}  # Track openings per date
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-
-        if "Door Open Event" in line:
-            timestamp_str = line.split("Door Open Event")[0].strip()
-            door_open_time = parse_timestamp(timestamp_str)
-            if door_open_time:
-                door_open_date = door_open_time.strftime("%m/%d/%Y")
+    for marker, event_time in zip(markers, event_times):
+        if marker == "Door Open Event":
+            door_open_time = None if np.isnat(event_time) else event_time
+            if door_open_time is not None:
+                door_open_date = door_open_time.astype('datetime64[D]')
                 # Increment the count for that date
                 door_open_count[door_open_date] = door_open_count.get(door_open_date, 0) + 1
-            else:
-                continue
-
-        elif "Door Close Event" in line and door_open_time is not None:
-            parts = line.split("Door Close Event")
-            timestamp_str = parts[0].strip()
-            try:
-                door_close_time = parse_timestamp(timestamp_str)
-                if door_close_time:
-                    time_of_opening_str = door_open_time.strftime("%I:%M:%S %p")
-                    time_of_closing_str = door_close_time.strftime("%I:%M:%S %p")
-                    duration_secs = round((door_close_time - door_open_time).total_seconds())
-                    no_of_door_openings = door_open_count.get(door_open_date, 1)
-                    door_event = 'open'
-                    data.append({
-                        "Date of Event": door_open_date,
-                        "Time of Opening": time_of_opening_str,
-                        "Time of Closing": time_of_closing_str,
-                        "Total Time of Opening (secs)": duration_secs,
-                        "No of Door Openings": no_of_door_openings,
-                        "door_event": door_event
-                    })
-                    door_open_time = None
-                    door_open_date = None
-            except (ValueError, IndexError):
-                continue
-
-    return pd.DataFrame(data)
-
-def detect_refrigerator_failure(raw_data) -> pd.DataFrame:
-    lines = raw_data.decode('utf-8').split('\n') if isinstance(raw_data, bytes) else raw_data.split('\n')
-    data = []
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        if "System Refrigeration Failure Alarm" in line:
-            parts = line.split(',')
-            timestamp = parts[0]
-            timestamp = parse_timestamp(timestamp)
-            
-            if timestamp:
-                # Convert to strings so JSON can handle them
-                date = timestamp.date().isoformat()     # "2025-08-11"
-                time = timestamp.time().strftime("%H:%M:%S")  # "09:14:29"
-                
-                data.append({
-                    "Date": date,
-                    "Time": time
-                })
-            
-    return pd.DataFrame(data)
+
+        elif door_open_time is not None and not np.isnat(event_time):
+            open_times.append(door_open_time)
+            close_times.append(event_time)
+            open_counts.append(door_open_count.get(door_open_date, 1))
+            door_open_time = None
+            door_open_date = None
+
+    if not open_times:
+        return pd.DataFrame()
+
+    # the text columns are what the UI shows, Open_dt/Close_dt keep the parsed values
+    open_dt = pd.Series(np.array(open_times, dtype='datetime64[ns]'))
+    close_dt = pd.Series(np.array(close_times, dtype='datetime64[ns]'))
+    return pd.DataFrame({
+        "Date of Event": open_dt.dt.strftime("%m/%d/%Y"),
+        "Time of Opening": open_dt.dt.strftime("%I:%M:%S %p"),
+        "Time of Closing": close_dt.dt.strftime("%I:%M:%S %p"),
+        "Total Time of Opening (secs)": (close_dt - open_dt).dt.total_seconds().round().astype('int64'),
+        "No of Door Openings": open_counts,
+        "door_event": 'open',
+        "Open_dt": open_dt,
+        "Close_dt": close_dt
+    })
+
+def detect_refrigerator_failure(raw_data, timestamp_format=None) -> pd.DataFrame:
+    timestamps = parse_timestamps(_ref_timestamp_strs(_as_scan(raw_data).ref_lines), timestamp_format).dropna()
+
+    if timestamps.empty:
+        return pd.DataFrame()
+
+    # Convert to strings so JSON can handle them
+    return pd.DataFrame({
+        "Date": timestamps.dt.strftime("%Y-%m-%d"),  # "2025-08-11"
+        "Time": timestamps.dt.strftime("%H:%M:%S")   # "09:14:29"
+    }).reset_index(drop=True)
 
 # function to check file type
-def check_file_type(df: pd.DataFrame) -> str:
+# placeholder readings a PUC writes for an absent or disconnected channel
+SENTINEL_VALUES = (-127, 0, 127)
+# a channel is a placeholder when nearly all of its readings are one sentinel value
+PLACEHOLDER_FRACTION = 0.99
+
+@dataclass
+class ColumnStats:
+    count: int
+    mean: float
+    min: float
+    max: float
+    argmin: int | None  # row positions of the first min and max
+    argmax: int | None
+    argmin_time: str | None
+    argmax_time: str | None
+    sentinel_fractions: dict[int, float]
+
+@dataclass
+class ColumnProfile:
+    """
+    Per-column statistics of a frame, taken once and carried in df.attrs['column_profile']
+    (as plain JSON-able values, so the frame still round-trips through Parquet).
+    rows guards against reusing the profile of a frame for a filtered slice of it; code
+    rewriting a profiled column (or Date/Time) calls forget_column_stats.
     """
-    Determine file type (STP1, STP, TSX) based on column existence and mean values.
+    rows: int
+    columns: dict[str, ColumnStats] = field(default_factory=dict)
+
+    def __contains__(self, col) -> bool:
+        return col in self.columns
+
+    def __getitem__(self, col) -> ColumnStats:
+        return self.columns[col]
+
+    def mean(self, col) -> float:
+        return self.columns[col].mean
+
+    def placeholder(self, col) -> bool:
+        return max(self.columns[col].sentinel_fractions.values()) >= PLACEHOLDER_FRACTION
+
+    def add(self, df: pd.DataFrame, columns) -> None:
+        times = df['Date/Time'] if 'Date/Time' in df.columns else None
+        for col in columns:
+            self.columns[col] = _column_stats(df[col], times)
+
+    def to_attrs(self) -> dict:
+        return {'rows': self.rows, 'columns': {col: asdict(stats) for col, stats in self.columns.items()}}
+
+    @classmethod
+    def from_attrs(cls, attrs: dict) -> 'ColumnProfile':
+        columns = {}
+        for col, stats in attrs['columns'].items():
+            # JSON turns the sentinel keys into strings
+            fractions = {int(value): fraction for value, fraction in stats['sentinel_fractions'].items()}
+            columns[col] = ColumnStats(**{**stats, 'sentinel_fractions': fractions})
+        return cls(attrs['rows'], columns)
+
+def _time_at(times: pd.Series | None, position: int | None) -> str | None:
+    return None if times is None or position is None else str(times.iloc[position])
+
+def _column_stats(values: pd.Series, times: pd.Series | None) -> ColumnStats:
+    count = int(values.count())
+    array = values.to_numpy()
+    fractions = {
+        value: (int(np.count_nonzero(array == value)) / count if count else 0.0)
+        for value in SENTINEL_VALUES
+    }
+    if count == 0:
+        return ColumnStats(0, float('nan'), float('nan'), float('nan'), None, None, None, None, fractions)
+
+    argmin, argmax = int(values.argmin()), int(values.argmax())
+    return ColumnStats(
+        count=count,
+        mean=float(values.mean()),
+        min=float(values.min()),
+        max=float(values.max()),
+        argmin=argmin,
+        argmax=argmax,
+        argmin_time=_time_at(times, argmin),
+        argmax_time=_time_at(times, argmax),
+        sentinel_fractions=fractions
+    )
+
+def column_profile(df: pd.DataFrame, columns=()) -> ColumnProfile:
+    """
+    The profile carried by df, extended with any of columns it doesn't cover yet.
+    Columns missing from df are skipped, so reading them from the profile raises KeyError
+    just like df[col] would.
+    """
+    attrs = df.attrs.get('column_profile')
+    if attrs is not None and attrs['rows'] == len(df):
+        profile = ColumnProfile.from_attrs(attrs)
+    else:
+        profile = ColumnProfile(len(df))
+
+    missing = [col for col in columns if col in df.columns and col not in profile]
+    if missing or attrs is None:
+        profile.add(df, missing)
+        df.attrs['column_profile'] = profile.to_attrs()
+    return profile
+
+def forget_column_stats(df: pd.DataFrame, columns) -> None:
+    """
+    Drop the profiled statistics of columns df has rewritten, the next column_profile takes
+    them anew. A rewritten Date/Time keeps them but re-reads every min and max time.
+    """
+    attrs = df.attrs.get('column_profile')
+    if attrs is None or attrs['rows'] != len(df):
+        return
+    profile = ColumnProfile.from_attrs(attrs)
+    for col in columns:
+        profile.columns.pop(col, None)
+    if 'Date/Time' in columns:
+        times = df['Date/Time'] if 'Date/Time' in df.columns else None
+        for stats in profile.columns.values():
+            stats.argmin_time = _time_at(times, stats.argmin)
+            stats.argmax_time = _time_at(times, stats.argmax)
+    # a new dict, the attrs of the frame df was derived from may share the old one
+    df.attrs['column_profile'] = profile.to_attrs()
+
+def check_file_type(df: pd.DataFrame, profile: ColumnProfile | None = None) -> str:
+    """
+    Determine file type (STP1, STP, TSX) based on column existence and placeholder channels,
+    ones whose profiled readings are (nearly) all one of the -127/0/127 sentinels.
     Rules:
-    - STP1: TC3,TC4,TC7,TC9,Stage1RPM,Stage2RPM exist, all means in {-127,0,127}
-    - STP: Stage1/2RPM may exist, if exist means in {-127,0,127}, TC3/4/7/9 exist but means NOT in {-127,0,127}
-    - TSX: Stage1/2RPM exist but means NOT in {-127,0,127}, TC3/4/7/9 exist but means NOT in {-127,0,127}, TC8 optional and valid if exists
+    - STP1: TC3,TC4,TC7,TC9,Stage1RPM,Stage2RPM exist, all placeholders
+    - STP: Stage1/2RPM may exist, if exist placeholders, TC3/4/7/9 exist but NOT placeholders
+    - TSX: Stage1/2RPM exist but NOT placeholders, TC3/4/7/9 exist but NOT placeholders, TC8 optional and a placeholder if exists
     """
     
-    valid_means = {-127, 0, 127}
     tc_columns = ['TC3', 'TC4', 'TC7', 'TC9']
     stage_columns = ['Stage 1 RPM', 'Stage 2 RPM']
+    if profile is None:
+        profile = column_profile(df, tc_columns + stage_columns + ['TC8'])
 
     # --- 1️⃣ STP1 check ---
     if all(col in df.columns for col in tc_columns + stage_columns):
-        if all(int(round(df[col].mean())) in valid_means for col in tc_columns + stage_columns):
+        if all(profile.placeholder(col) for col in tc_columns + stage_columns):
             return "STP1"
 
     # --- 2️⃣ STP check ---
     # Stage columns may or may not exist
     stage_check = True
     if any(col in df.columns for col in stage_columns):
-        stage_check = all(int(round(df[col].mean())) in valid_means for col in stage_columns if col in df.columns)
+        stage_check = all(profile.placeholder(col) for col in stage_columns if col in df.columns)
     
-    # TC3/4/7/9 means must NOT be in valid_means
-    tc_check = all(int(round(df[col].mean())) not in valid_means for col in tc_columns)
+    # TC3/4/7/9 must NOT be placeholders
+    tc_check = all(not profile.placeholder(col) for col in tc_columns)
     
     if stage_check and tc_check:
         return "STP"
 
     # --- 3️⃣ TSX check ---
-    # Stage columns exist but their means NOT in valid_means
+    # Stage columns exist but are NOT placeholders
     if all(col in df.columns for col in stage_columns):
-        stage_invalid = all(int(round(df[col].mean())) not in valid_means for col in stage_columns)
-        tc_invalid = all(int(round(df[col].mean())) not in valid_means for col in tc_columns)
+        stage_invalid = all(not profile.placeholder(col) for col in stage_columns)
+        tc_invalid = all(not profile.placeholder(col) for col in tc_columns)
         
         if stage_invalid and tc_invalid:
             # Optional TC8 check
             if 'TC8' in df.columns:
-                if int(round(df['TC8'].mean())) in valid_means:
+                if profile.placeholder('TC8'):
                     return "TSX"
             else:
                 return "TSX"
@@ -231,77 +668,114 @@ def check_file_type(df: pd.DataFrame) -> str:
 def map_door_status_to_df(df: pd.DataFrame, door_event_df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     df['Date/Time'] = pd.to_datetime(df['Date/Time']).dt.floor('min')
-    df['Door_Status'] = 0  # default
+    df['Door_Status'] = np.int8(0)  # default
+    # the profiled min and max times are re-read from the floored times
+    forget_column_stats(df, ['Date/Time', 'Door_Status'])
 
-    # Prepare event times
+    if door_event_df.empty:
+        return df
+
+    # Prepare event times, detect_door_events already carries them as datetime64
     door_event_df = door_event_df.copy()
-    door_event_df['Open_dt'] = pd.to_datetime(
-        door_event_df['Date of Event'].astype(str) + ' ' + door_event_df['Time of Opening'].astype(str)
-    ).dt.floor('min')
-    door_event_df['Close_dt'] = pd.to_datetime(
-        door_event_df['Date of Event'].astype(str) + ' ' + door_event_df['Time of Closing'].astype(str)
-    ).dt.floor('min')
+    if 'Open_dt' in door_event_df.columns and 'Close_dt' in door_event_df.columns:
+        door_event_df['Open_dt'] = door_event_df['Open_dt'].dt.floor('min')
+        door_event_df['Close_dt'] = door_event_df['Close_dt'].dt.floor('min')
+    else:
+        door_event_df['Open_dt'] = pd.to_datetime(
+            door_event_df['Date of Event'].astype(str) + ' ' + door_event_df['Time of Opening'].astype(str),
+            format="%m/%d/%Y %I:%M:%S %p"
+        ).dt.floor('min')
+        door_event_df['Close_dt'] = pd.to_datetime(
+            door_event_df['Date of Event'].astype(str) + ' ' + door_event_df['Time of Closing'].astype(str),
+            format="%m/%d/%Y %I:%M:%S %p"
+        ).dt.floor('min')
 
     # Handle cross-midnight
     mask = door_event_df['Close_dt'] < door_event_df['Open_dt']
     door_event_df.loc[mask, 'Close_dt'] += pd.Timedelta(days=1)
 
-    # Iterate through each event and set statuses
-    for _, row in door_event_df.iterrows():
-        open_secs = row['Total Time of Opening (secs)']
+    # Cooldown mins based on how long the door stayed open
+    open_secs = door_event_df['Total Time of Opening (secs)'].to_numpy(dtype=float)
+    cooldown_mins = np.select(
+        [open_secs < 60, (open_secs >= 60) & (open_secs <= 300)],
+        [60, 180],   # 1 hour, 3 hours
+        default=360  # 6 hours
+    )
+    close_dt = door_event_df['Close_dt']
+
+    times = df['Date/Time'].to_numpy(dtype='datetime64[ns]')
+    in_open = _covered_by_intervals(times, door_event_df['Open_dt'], close_dt)
+    in_cooldown = _covered_by_intervals(
+        times,
+        close_dt + pd.Timedelta(minutes=1),
+        close_dt + pd.to_timedelta(cooldown_mins, unit='min')
+    )
+
+    # An open period beats a cooldown, whatever the order of the events
+    df['Door_Status'] = np.where(in_open, 1, np.where(in_cooldown, -1, 0)).astype(np.int8)
+
+    return df
 
-        # Define cooldown mins based on conditions
-        if open_secs < 60:
-            cooldown_mins = 60     # 1 hour
-        elif 60 <= open_secs <= 300:
-            cooldown_mins = 180    # 3 hours
-        else:
-            cooldown_mins = 360    # 6 hours
+def _covered_by_intervals(times: np.ndarray, starts: pd.Series, ends: pd.Series) -> np.ndarray:
+    """
+    Mark the times that fall in at least one closed [start, end] interval using a
+    difference array over the sorted times. The stable sort is linear for
+    time-ordered telemetry, so this is O(rows + intervals). NaT is never covered.
+    """
+    keys = times.view('int64')
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
 
-        # Mark open period as 1
-        mask_open = (df['Date/Time'] >= row['Open_dt']) & (df['Date/Time'] <= row['Close_dt'])
-        df.loc[mask_open, 'Door_Status'] = 1
+    lo = np.searchsorted(sorted_keys, starts.to_numpy(dtype='datetime64[ns]').view('int64'), side='left')
+    hi = np.searchsorted(sorted_keys, ends.to_numpy(dtype='datetime64[ns]').view('int64'), side='right')
+    valid = lo < hi
 
-        # Mark cooldown period as -1 (only if still 0)
-        cooldown_start = row['Close_dt'] + pd.Timedelta(minutes=1)
-        cooldown_end = row['Close_dt'] + pd.Timedelta(minutes=cooldown_mins)
-        mask_cooldown = (df['Date/Time'] >= cooldown_start) & (df['Date/Time'] <= cooldown_end)
-        df.loc[mask_cooldown & (df['Door_Status'] == 0), 'Door_Status'] = -1
+    n = len(keys)
+    depth = np.cumsum(
+        np.bincount(lo[valid], minlength=n + 1) - np.bincount(hi[valid], minlength=n + 1)
+    )[:n]
 
-    return df
+    covered = np.empty(n, dtype=bool)
+    covered[order] = depth > 0
+    return covered
 
 # Newer preprocessing function, creates events dataframes, checks file type, maps door to df, returns a tuple
 def preprocess_puc_file(raw_data) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str] | None:
-    columns = [
-        "Date/Time", "RTD", "TC1", "TC2", "TC3", "TC4", "TC6", 
-        "TC7", "TC9", "TC10", "Setpoint", "Voltage", "PUC_State", "User Offset", 
-        "Warm Warning setpoint", "Cold Warning setpoint", "Stage 1 RPM", "Stage 2 RPM", 
-        "HxHxRec", "Fan State", "VscRefStageMSB", "VscRefStageLSB", "BUS RTD", 
-        "RSSI", "latency", "TC8"
-    ]
-    
-    if isinstance(raw_data, bytes):
-        raw_data = raw_data.decode('utf-8')
+    return _preprocess_scan(scan_puc_data(raw_data))
 
-    lines = raw_data.split('\n')
-    data_lines = [line for line in lines if not line.startswith('PUC_VER')]
+# Same as preprocess_puc_file for an upload stream, which is never held in memory as a whole
+def preprocess_puc_stream(stream, chunk_size=DEFAULT_CHUNK_SIZE, memory_budget=DEFAULT_MEMORY_BUDGET) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str] | None:
+    return _preprocess_scan(scan_puc_stream(stream, chunk_size, memory_budget))
 
-    if not data_lines:
+def _preprocess_scan(scan: PucScan) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str] | None:
+    if not scan.has_data:
         return None
 
-    expected_col_count = len(data_lines[0].split(','))
-    valid_lines = [line for line in data_lines if len(line.split(',')) == expected_col_count]
-    data_str = "\n".join(valid_lines)
-    
-    door_events = detect_door_events(raw_data)
-    power_events = detect_power_events(raw_data)
-    ref_df = detect_refrigerator_failure(raw_data)
+    # the last read_csv flush and the frame assembly run alongside the event detection
+    return _preprocess_frames(scan, submit('telemetry_frame', _telemetry_frame, scan))
 
-    df = pd.read_csv(StringIO(data_str), header=None)
-    df.columns = columns[:df.shape[1]]
+def _telemetry_frame(scan: PucScan) -> pd.DataFrame:
+    df = scan.telemetry_frame()
+    df.columns = PUC_COLUMNS[:df.shape[1]]
+    df.attrs['line_counts'] = dict(scan.counts)
     df['Date/Time'] = pd.to_datetime(df['Date/Time'], errors='coerce')
+    df.attrs['bytes_per_row'] = {
+        'before': scan._loaded_nbytes / max(len(df), 1),
+        'after': bytes_per_row(df)
+    }
+    return df
+
+def _preprocess_frames(scan: PucScan, df) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str] | None:
+    # the event tables only read the scan's event lines, the telemetry (df or its future) its columns
+    timestamp_format = infer_scan_timestamp_format(scan)
+    door_events = submit('door_events', detect_door_events, scan, timestamp_format)
+    power_events = submit('power_events', detect_power_events, scan, timestamp_format)
+    ref_df = submit('refrigeration_events', detect_refrigerator_failure, scan, timestamp_format)
+    df = resolve(df)
     
-    file_type = check_file_type(df)
+    # statistics of the telemetry columns, reused by the file type check, rules and summary
+    profile = column_profile(df, [col for col in TELEMETRY_DTYPES if col in df.columns])
+    file_type = check_file_type(df, profile)
     if file_type == "STP1":
         note = "The provide file is for STP1 the product is built before 2022 there is no sufficient data for analysis. Manual analysis required."
     elif file_type == "File Type not Found":
@@ -318,11 +792,132 @@ def preprocess_puc_file(raw_data) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFr
     
     if before_45_days < df['Date/Time'].min():
         return None
-    df = map_door_status_to_df(df, door_events)
+    door_events = door_events.result()
+    with span('map_door_status', len(df)):
+        df = map_door_status_to_df(df, door_events)
     if five_months_ago < df['Date/Time'].min():
-        return df, door_events, power_events, ref_df, file_type, note
+        return df, door_events, power_events.result(), ref_df.result(), file_type, note
     # df_last_3_months = df[df['Date/Time'] >= three_months_ago]
-    return df, door_events, power_events, ref_df, file_type, note
+    return df, door_events, power_events.result(), ref_df.result(), file_type, note
+
+# Several consecutive exports of one freezer: parsed in parallel, merged by time, analysed once
+def parse_puc_path(path) -> tuple[PucScan, pd.DataFrame | None]:
+    """
+    Scan and parse one export on disk, on a stage thread: reading and the CSV parser
+    release the GIL, so several files are parsed at once.
+    """
+    scan = scan_puc_path(path)
+    return scan, (_telemetry_frame(scan) if scan.has_data else None)
+
+def _merge_by_time(parts: list[pd.DataFrame], time_col: str, key_col: str) -> pd.DataFrame:
+    """
+    k-way merge of per-file tables by time_col, keeping each file's own row order.
+    A row sorts by the latest time seen so far in its file, which is non-decreasing,
+    so one stable sort of the concatenation merges the k runs (a NaT rides along with
+    the row before it). Rows a later file repeats from an earlier one (same key_col)
+    are dropped; repeats within one file are kept as they were.
+    """
+    merge_keys = [
+        np.maximum.accumulate(part[time_col].to_numpy(dtype='datetime64[ns]').view('int64'))
+        for part in parts
+    ]
+    df = pd.concat(
+        [part.assign(_source=source) for source, part in enumerate(parts)],
+        ignore_index=True
+    )
+    df = df.iloc[np.argsort(np.concatenate(merge_keys), kind='stable')]
+
+    first_source = df.groupby(key_col, dropna=False, sort=False)['_source'].transform('first')
+    keep = (df['_source'] == first_source) | df[key_col].isna()
+    return df[keep].drop(columns='_source').reset_index(drop=True)
+
+def merge_telemetry_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Merge per-file telemetry by Date/Time. Where files overlap the earlier file's rows are kept."""
+    df = _merge_by_time(frames, 'Date/Time', 'Date/Time')
+
+    # a column one file lacks comes back as float64, compact it again
+    apply_telemetry_dtypes(df)
+    df.attrs = {}
+    return df
+
+def _merge_event_lines(line_lists: list[list[str]], formats: list[str | None], timestamp_strs) -> list[str]:
+    # event lines of every file in time order, an event repeated by an overlapping file once
+    parts = [
+        pd.DataFrame({
+            'line': pd.Series(lines, dtype=object),
+            'time': parse_timestamps(timestamp_strs(lines), timestamp_format).to_numpy(dtype='datetime64[ns]')
+        })
+        for lines, timestamp_format in zip(line_lists, formats)
+    ]
+    return _merge_by_time(parts, 'time', 'line')['line'].tolist()
+
+def merge_puc_scans(parsed: list[tuple[PucScan, pd.DataFrame]]) -> tuple[PucScan, pd.DataFrame]:
+    """One scan and telemetry frame standing for several exports, as if they were one file."""
+    scans = [scan for scan, _ in parsed]
+    formats = [infer_scan_timestamp_format(scan) for scan in scans]
+
+    merged = PucScan(expected_col_count=scans[0].expected_col_count)
+    for scan in scans:
+        for name, count in scan.counts.items():
+            merged.counts[name] += count
+        merged._loaded_nbytes += scan._loaded_nbytes
+        merged.malformed_lines.extend(scan.malformed_lines)
+
+    merged.door_lines = _merge_event_lines(
+        [scan.door_lines for scan in scans], formats,
+        lambda lines: _event_timestamp_strs(lines, DOOR_EVENTS)[0]
+    )
+    merged.power_lines = _merge_event_lines(
+        [scan.power_lines for scan in scans], formats,
+        lambda lines: _event_timestamp_strs(lines, POWER_EVENTS)[0]
+    )
+    merged.ref_lines = _merge_event_lines([scan.ref_lines for scan in scans], formats, _ref_timestamp_strs)
+
+    df = merge_telemetry_frames([frame for _, frame in parsed])
+    df.attrs['line_counts'] = dict(merged.counts)
+    df.attrs['bytes_per_row'] = {
+        'before': merged._loaded_nbytes / max(len(df), 1),
+        'after': bytes_per_row(df)
+    }
+    return merged, df
+
+def preprocess_puc_filepaths(paths) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str] | None:
+    """
+    preprocess_puc_filepath for several exports of the same freezer: the files are parsed
+    concurrently on the stage pool, then telemetry and events are merged by time and the
+    rest of the pipeline runs once on the combined result.
+    """
+    paths = list(paths)
+    if len(paths) == 1:
+        return preprocess_puc_filepath(paths[0])
+
+    files = [submit('parse_file', parse_puc_path, path) for path in paths]
+    parsed = [(scan, df) for scan, df in (file.result() for file in files) if scan.has_data]
+    if not parsed:
+        return None
+
+    return _preprocess_frames(*merge_puc_scans(parsed))
+
+def _band_trends(values, lower, upper, trend_out: np.ndarray, in_range_out: np.ndarray) -> None:
+    # in band -> 0, above -> 1, below or missing -> -1, written into the given rows
+    np.greater_equal(values, lower, out=in_range_out)
+    in_range_out &= values <= upper
+    trend_out.fill(-1)
+    trend_out[in_range_out] = 0
+    trend_out[values > upper] = 1
+
+def in_range_mask(in_range: np.ndarray) -> np.ndarray:
+    """Pack a channels x rows in-range matrix into one integer per row, bit i for channel i."""
+    weights = np.uint16(1) << np.arange(in_range.shape[0], dtype=np.uint16)
+    return (weights[:, None] * in_range).sum(axis=0, dtype=np.uint16)
+
+def trend_matrix(df: pd.DataFrame, channels=None) -> np.ndarray:
+    """
+    The rows x channels int8 trend matrix feature_engineering built, without a copy when
+    the _trend columns are still the block it created. channels defaults to all of them.
+    """
+    channels = df.attrs['trend_channels'] if channels is None else channels
+    return df[[f'{tc}_trend' for tc in channels]].to_numpy()
 
 def feature_engineering(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
     # Add new column: difference of RTD and setpoint
@@ -350,87 +945,44 @@ def feature_engineering(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
     else:
         print("Error: 'Setpoint' or 'User Offset' column is missing. RTD bounds cannot be calculated.")
     
-    available_tcs = [tc for tc in tcs_dict if tc in df.columns]
-    
-    # Step 1: Flag values within normal range for other temperature channels (TC1, TC2, etc.)
-    for tc in available_tcs:
-        if tc == 'RTD':
-            continue
-        
-        lower_bound, upper_bound = tcs_dict[tc]
-        df[f'{tc}_in_range'] = df[tc].between(lower_bound, upper_bound)
-        
-        df[f'{tc}_trend'] = np.where(
-            df[f'{tc}_in_range'],
-            0,
-            np.where(df[tc] > upper_bound, 1, -1)
-        )
-        
-    # === RTD check: dynamically calculated based on Setpoint ===
-    if 'RTD' in df.columns and 'lower_bound_RTD' in df.columns and 'upper_bound_RTD' in df.columns:
-        # Check if RTD is within the defined range
-        df['RTD_in_range'] = (df['RTD'] >= df['lower_bound_RTD']) & (df['RTD'] <= df['upper_bound_RTD'])
-        
-        # Add RTD_trend column for trend analysis
-        df['RTD_trend'] = np.where(
-            df['RTD_in_range'],  # If within range, assign 0
-            0,
-            np.where(df['RTD'] > df['upper_bound_RTD'], 1, -1)  # If greater than upper bound, trend is 1; else, -1
-        )
-    else:
+    # thermocouples with a fixed band, then RTD against its setpoint band; this is the
+    # column order of the trend matrix and the bit order of In_Range_Mask
+    band_tcs = [tc for tc in tcs_dict if tc != 'RTD' and tc in df.columns]
+    has_rtd = 'RTD' in df.columns and 'lower_bound_RTD' in df.columns and 'upper_bound_RTD' in df.columns
+    if not has_rtd:
         print("Error: 'RTD', 'lower_bound_RTD', or 'upper_bound_RTD' column is missing. RTD range check cannot be performed.")
-    
-    return df, tcs_dict
+    channels = band_tcs + (['RTD'] if has_rtd else [])
 
-def preprocess_puc_filepath(path) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str] | None:
-    columns = [
-        "Date/Time", "RTD", "TC1", "TC2", "TC3", "TC4", "TC6", 
-        "TC7", "TC9", "TC10", "Setpoint", "Voltage", "PUC state", "User Offset", 
-        "Warm Warning setpoint", "Cold Warning setpoint", "Stage 1 RPM", "Stage 2 RPM", 
-        "HxHxRec", "Fan State", "VscRefStageMSB", "VscRefStageLSB", "BUS RTD", 
-        "RSSI", "latency", "TC8"
-    ]
-    
-    with open(path, 'rb') as f:
-        raw_data = f.read().decode('utf-8')
+    # one channels x rows buffer each, so every legacy column below is a contiguous view
+    trends = np.empty((len(channels), len(df)), dtype=np.int8)
+    in_range = np.empty((len(channels), len(df)), dtype=bool)
 
-    lines = raw_data.split('\n')
-    data_lines = [line for line in lines if not line.startswith('PUC_VER')]
+    # Step 1: every thermocouple band in one broadcast, the bands as a channels x 1 column
+    if band_tcs:
+        lower = np.array([tcs_dict[tc][0] for tc in band_tcs], dtype=float)[:, None]
+        upper = np.array([tcs_dict[tc][1] for tc in band_tcs], dtype=float)[:, None]
+        _band_trends(df[band_tcs].to_numpy().T, lower, upper, trends[:len(band_tcs)], in_range[:len(band_tcs)])
 
-    if not data_lines:
-        return None
-
-    expected_col_count = len(data_lines[0].split(','))
-    valid_lines = [line for line in data_lines if len(line.split(',')) == expected_col_count]
-    data_str = "\n".join(valid_lines)
-    
-    door_events = detect_door_events(raw_data)
-    power_events = detect_power_events(raw_data)
-    ref_df = detect_refrigerator_failure(raw_data)
+    # === RTD check: dynamically calculated based on Setpoint ===
+    if has_rtd:
+        _band_trends(
+            df['RTD'].to_numpy(), df['lower_bound_RTD'].to_numpy(), df['upper_bound_RTD'].to_numpy(),
+            trends[-1], in_range[-1]
+        )
 
-    df = pd.read_csv(StringIO(data_str), header=None)
-    df.columns = columns[:df.shape[1]]
-    df['Date/Time'] = pd.to_datetime(df['Date/Time'], errors='coerce')
+    # legacy per-channel columns; the _trend columns keep their relative order
+    features = pd.concat([
+        pd.DataFrame(in_range.T, index=df.index, columns=[f'{tc}_in_range' for tc in channels], copy=False),
+        pd.DataFrame(trends.T, index=df.index, columns=[f'{tc}_trend' for tc in channels], copy=False)
+    ], axis=1)
+    features['In_Range_Mask'] = in_range_mask(in_range)
+    attrs = df.attrs
+    df = pd.concat([df, features], axis=1)
+    df.attrs = {**attrs, 'trend_channels': channels}
     
-    file_type = check_file_type(df)
-    if file_type == "STP1":
-        note = "The provide file is for STP1 the product is built before 2022 there is no sufficient data for analysis. Manual analysis required."
-    elif file_type == "File Type not Found":
-        note = "File type not recognized. Data will be processed with default settings."
-    else:
-        note = f"File type detected as {file_type}."
-    print(note)
+    column_profile(df, list(df.filter(regex='_trend$').columns))
+    df.attrs['bytes_per_row_features'] = bytes_per_row(df)
+    return df, tcs_dict
 
-    # Calculate the date 3 months before max date
-    # three_months_ago = df['Date/Time'].max() - pd.DateOffset(months=3)
-    
-    five_months_ago = df['Date/Time'].max() - pd.DateOffset(months=5)
-    before_45_days = df['Date/Time'].max() - pd.DateOffset(days=45)
-    
-    if before_45_days < df['Date/Time'].min():
-        return None
-    df = map_door_status_to_df(df, door_events)
-    if five_months_ago < df['Date/Time'].min():
-        return df, door_events, power_events, ref_df, file_type, note
-    # df_last_3_months = df[df['Date/Time'] >= three_months_ago]
-    return df, door_events, power_events, ref_df, file_type, note
\ No newline at end of file
+def preprocess_puc_filepath(path) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, str] | None:
+    return _preprocess_scan(scan_puc_path(path))
\ No newline at end of file
@@ -0,0 +1,144 @@
+# opt-in call profiles of single slow requests, captured to disk to inspect offline
+import os
+import re
+import json
+import time
+import uuid
+import cProfile
+import threading
+import importlib.util
+from flask import g, has_request_context
+
+DEFAULT_MAX_PROFILES = 50
+# a request opts in with the header, or the query parameter from a browser
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+PROFILED_ENDPOINTS = ('main.process_file', 'main.visualizations', 'main.download_word')
+# deterministic call counts, or a low-overhead statistical profile if pyinstrument is installed
+DETERMINISTIC = 'cprofile'
+SAMPLING = 'sampling'
+
+_REQUEST_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+def requested_profiler(request, allowed_addrs) -> str | None:
+    """The profiler a request asked for, None if it didn't or its address isn't allowed."""
+    value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    if not value or value.lower() in ('0', 'false', 'off'):
+        return None
+    if request.remote_addr not in allowed_addrs:
+        return None
+    return SAMPLING if value.lower() == SAMPLING else DETERMINISTIC
+
+def profiling_request() -> bool:
+    """Whether the current request is being profiled; the profile only follows the request's thread."""
+    return has_request_context() and g.get('profile') is not None
+
+class Capture:
+    """The running profile of one request."""
+
+    def __init__(self, request_id: str, profiler: str):
+        self.request_id = request_id
+        self.profiler = profiler
+        if profiler == SAMPLING:
+            from pyinstrument import Profiler
+            self._profile = Profiler()
+        else:
+            self._profile = cProfile.Profile()
+        self._start = None
+        self.seconds = None
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        if self.profiler == SAMPLING:
+            self._profile.start()
+        else:
+            self._profile.enable()
+
+    def stop(self) -> None:
+        if self.profiler == SAMPLING:
+            self._profile.stop()
+        else:
+            self._profile.disable()
+        self.seconds = time.perf_counter() - self._start
+
+    def dump(self, path: str) -> None:
+        if self.profiler == SAMPLING:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self._profile.output_html())
+        else:
+            self._profile.dump_stats(path)
+
+class ProfileStore:
+    """
+    Profiles of opted-in requests, each saved as a profile file (pstats, or pyinstrument HTML)
+    next to a JSON record of the request: endpoint, upload digest, rows, file type and seconds,
+    both named by request ID. One request is profiled at a time, and past max_profiles the
+    oldest are removed.
+    """
+
+    def __init__(self, root, max_profiles=DEFAULT_MAX_PROFILES):
+        self.root = root
+        self.max_profiles = max_profiles
+        self._active = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def start(self, request_id=None, profiler=DETERMINISTIC) -> Capture | None:
+        """Profile the current thread from here on; None while another request is being profiled."""
+        if not self._active.acquire(blocking=False):
+            return None
+        if request_id is None or not _REQUEST_ID.fullmatch(request_id) or self.record(request_id) is not None:
+            request_id = uuid.uuid4().hex
+        if profiler == SAMPLING and importlib.util.find_spec('pyinstrument') is None:
+            profiler = DETERMINISTIC
+        try:
+            capture = Capture(request_id, profiler)
+            capture.start()
+        except Exception:
+            self._active.release()
+            raise
+        return capture
+
+    def save(self, capture: Capture, **meta) -> dict:
+        """Stop the capture and write it with meta (upload_digest, rows, file_type, ...)."""
+        try:
+            capture.stop()
+            extension = 'html' if capture.profiler == SAMPLING else 'prof'
+            record = {
+                'request_id': capture.request_id,
+                'profiler': capture.profiler,
+                'file': f'{capture.request_id}.{extension}',
+                'created': time.time(),
+                'seconds': capture.seconds,
+                **meta,
+            }
+            capture.dump(os.path.join(self.root, record['file']))
+            with open(os.path.join(self.root, f'{capture.request_id}.json'), 'w', encoding='utf-8') as f:
+                json.dump(record, f, default=str)
+        finally:
+            self._active.release()
+        self._prune()
+        return record
+
+    def record(self, request_id: str) -> dict | None:
+        if not _REQUEST_ID.fullmatch(request_id):
+            return None
+        try:
+            with open(os.path.join(self.root, f'{request_id}.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def records(self) -> list[dict]:
+        """The saved profiles, newest first."""
+        records = [
+            self.record(name[:-len('.json')]) for name in os.listdir(self.root) if name.endswith('.json')
+        ]
+        return sorted((r for r in records if r is not None), key=lambda r: r['created'], reverse=True)
+
+    def _prune(self) -> None:
+        for record in self.records()[self.max_profiles:]:
+            for name in (record['file'], f"{record['request_id']}.json"):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
\ No newline at end of file
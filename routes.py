@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, render_template, make_response
+from flask import Blueprint, request, jsonify, render_template, make_response, current_app, g, send_from_directory
 import time
 from docx import Document
 import tempfile
@@ -6,12 +6,8 @@ import os
 import pandas as pd
 from docx.shared import Inches
 import io
-from .preprocessing import (
-    preprocess_puc_file, feature_engineering
-)
-
-from .predictions import set_flag_conditions as stp_conditions
-from .tsx_predictions import set_flag_conditions as tsx_conditions
+from .preprocessing import preprocess_puc_stream, preprocess_puc_filepaths
+from .pipeline import analyse_package
 
 from .visualizations import (
     make_flagged,
@@ -20,7 +16,10 @@ from .visualizations import (
     plot_trend_issue_altair,
     plot_tc10, plot_tc1_tc6
 )
-from .summary import generate_summary
+from .cache import uploads_digest
+from .labels import issue_labels, model_label_codes
+from .tracing import METRICS, span, record, server_timing
+from .profiling import PROFILED_ENDPOINTS, requested_profiler
 
 # imports for file download
 import re
@@ -32,64 +31,201 @@ main = Blueprint('main', __name__)
 DF = None
 CHARTS: dict = {}
 FLAGGED = None
+# digest, rows and file type of the upload DF comes from, which the routes reading DF profile
+UPLOAD: dict = {}
+
+@main.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    profiles = current_app.extensions.get('puc_profiles')
+    if profiles is not None and request.endpoint in PROFILED_ENDPOINTS:
+        profiler = requested_profiler(request, current_app.config['PUC_PROFILE_ALLOWED_ADDRS'])
+        if profiler is not None:
+            g.profile = profiles.start(request.headers.get('X-Request-ID'), profiler)
+
+def save_profile(**meta):
+    capture = g.pop('profile', None)
+    if capture is None:
+        return None
+    return current_app.extensions['puc_profiles'].save(
+        capture, endpoint=request.endpoint, **g.get('upload', {}), **meta
+    )
+
+@main.after_request
+def add_server_timing(response):
+    # the spans the request ran, readable in the browser's network panel
+    spans = g.get('spans')
+    if spans:
+        response.headers['Server-Timing'] = server_timing(spans, time.perf_counter() - g.request_start)
+    profile = save_profile(status=response.status_code)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile['request_id']
+    return response
+
+@main.teardown_request
+def stop_profile(error=None):
+    # a request that raised never reaches after_request
+    save_profile(status=500, error=repr(error))
+
+def profiles_allowed():
+    return (
+        'puc_profiles' in current_app.extensions
+        and request.remote_addr in current_app.config['PUC_PROFILE_ALLOWED_ADDRS']
+    )
+
+@main.route('/profiles')
+def list_profiles():
+    if not profiles_allowed():
+        return jsonify({"status": "error", "message": "Profiling is not allowed."}), 403
+    return jsonify(current_app.extensions['puc_profiles'].records())
+
+@main.route('/profiles/<request_id>')
+def download_profile(request_id):
+    if not profiles_allowed():
+        return jsonify({"status": "error", "message": "Profiling is not allowed."}), 403
+    profiles = current_app.extensions['puc_profiles']
+    profile = profiles.record(request_id)
+    if profile is None:
+        return jsonify({"status": "error", "message": f"No profile {request_id}."}), 404
+    return send_from_directory(profiles.root, profile['file'], as_attachment=True)
+
+@main.route('/metrics')
+def metrics():
+    """Count, sum, quantiles and rows of every pipeline stage, for Prometheus to scrape."""
+    return current_app.response_class(METRICS.prometheus(), mimetype='text/plain; version=0.0.4')
 
 @main.route('/')
 def index():
     return render_template('index.html')
 
+def cache_store(store, *args):
+    # a failed write only costs the next upload a recompute
+    try:
+        store(*args)
+    except Exception as e:
+        print(f"Could not cache upload: {e}")
+
+@main.route('/cache/stats')
+def cache_stats():
+    cache = current_app.extensions.get('puc_cache')
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats})
+
+@main.route('/models')
+def list_models():
+    registry = current_app.extensions['puc_models']
+    return jsonify(registry.describe())
+
+@main.route('/predict', methods=['POST'])
+def predict():
+    # {"model": name (optional with a single model), "rows": [{feature: value, ...}, ...]}
+    registry = current_app.extensions['puc_models']
+    payload = request.get_json(silent=True) or {}
+
+    try:
+        model = registry.get(payload.get('model'))
+    except KeyError as e:
+        return jsonify({"status": "error", "message": str(e.args[0])}), 404
+
+    rows = payload.get('rows')
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        return jsonify({"status": "error", "message": "'rows' must be a non-empty list of feature objects."}), 400
+    features = pd.DataFrame.from_records(rows)
+    missing = [feature for feature in model.features if feature not in features.columns]
+    if missing:
+        return jsonify({"status": "error", "message": f"Missing features: {missing}"}), 400
+
+    try:
+        codes = registry.predict(model.name, features[model.features])
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Prediction failed: {e}"}), 400
+
+    return jsonify({
+        "status": "success",
+        "model": model.name,
+        "codes": codes.tolist(),
+        "labels": [str(label) for label in issue_labels(model_label_codes(codes))],
+    })
+
 @main.route('/process', methods=['POST'])
 def process_file():
-    file = request.files['file']
-    raw_data = file.read()
-    
-    package = preprocess_puc_file(raw_data)
-    
-    if package is None:
-        return jsonify({"status": "error", "message": "The data is lesser than 45 days for analysis more data requires, manual analysis required."}), 400
-    
-    df, door_events_original, power_events_df, ref_df, file_type, note = package
-    
+    # one or several consecutive exports of the same freezer
+    files = request.files.getlist('file')
+    if not files:
+        return jsonify({"status": "error", "message": "No file uploaded."}), 400
+    global DF, FLAGGED, CHARTS, UPLOAD
     
-    df, tcs = feature_engineering(df)
-    
-    if 'Total Time of Opening (secs)' in door_events_original.columns:
-        door_events_filtered = door_events_original[door_events_original['Total Time of Opening (secs)'] > 60]
-        
+    cache = current_app.extensions.get('puc_cache')
+    # a profiled upload is keyed by its digest too
+    if cache is not None or g.get('profile') is not None:
+        with span('digest'):
+            digest = uploads_digest([file.stream for file in files])
     else:
-        print("No 'Total Time of Opening (secs)' column found in door_events_original.")
-        door_events_filtered = pd.DataFrame()  # Empty DataFrame
+        digest = None
+    # what this request's profile is saved with, filled in as the upload gets through
+    g.upload = {'upload_digest': digest}
     
-    if ('Date of Event' in power_events_df.columns) and ('Event' in power_events_df.columns):
-        power_events_df = (
-            power_events_df
-            .groupby(['Date of Event', 'Event'])
-            .size()
-            .reset_index(name='Count of This Event on Day')
-        )
-        
+    # a repeat upload skips straight to the stored summary
+    if cache is not None and digest is not None:
+        analysed = cache.load_analysis(digest)
+        parsed = cache.load_parsed(digest)
+        if analysed is not None and parsed is not None:
+            summary, df = analysed
+            DF = df
+            g.upload.update(rows=len(df), file_type=summary.get('file_type'))
+            UPLOAD = dict(g.upload)
+            with span('make_flagged', len(df)):
+                FLAGGED = make_flagged(df.loc[df['Sustained_Issue'] == True, ['Date/Time', 'Trend_Flag']])
+            with span('door_histogram', len(parsed[1])):
+                CHARTS['Door Events'] = plot_door_histogram(parsed[1])
+            return jsonify(summary)
     else:
-        print("No 'Date of Event' and/or 'Event' columns found in power_events_df.")
-        power_events_df = pd.DataFrame()  # Empty DataFrame
-
-    if file_type == 'TSX':
-        df = tsx_conditions(df, ref_df)
-        
+        parsed = None
+    
+    if parsed is not None:
+        package = parsed
+    elif len(files) == 1:
+        # the upload is read in chunks, never as one bytes object
+        with span('parse') as parse:
+            package = preprocess_puc_stream(
+                files[0].stream,
+                chunk_size=current_app.config['PUC_INGEST_CHUNK_SIZE'],
+                memory_budget=current_app.config['PUC_INGEST_MEMORY_BUDGET']
+            )
+            parse.rows = len(package[0]) if package is not None else None
     else:
-        df = stp_conditions(df)
-
-    filtered = df.loc[df['Sustained_Issue'] == True, ['Date/Time', 'Trend_Flag']]
+        # parsed concurrently from disk, then merged by time
+        with span('parse') as parse, tempfile.TemporaryDirectory() as upload_dir:
+            paths = []
+            for i, file in enumerate(files):
+                path = os.path.join(upload_dir, f'{i}.puc')
+                file.save(path)
+                paths.append(path)
+            package = preprocess_puc_filepaths(paths)
+            parse.rows = len(package[0]) if package is not None else None
+    
+    if package is None:
+        return jsonify({"status": "error", "message": "The data is lesser than 45 days for analysis more data requires, manual analysis required."}), 400
+    
+    if cache is not None and digest is not None and parsed is None:
+        cache_store(cache.store_parsed, digest, package)
     
-    summary= generate_summary(df, door_events_filtered, power_events_df, door_events_original, tcs, ref_df, filtered)
+    analysis = analyse_package(package)
+    summary = analysis.summary
     
-    summary['file_type'] = file_type
-    summary['note'] = note
+    if cache is not None and digest is not None:
+        cache_store(cache.store_analysis, digest, summary, analysis.df)
     
     # global variables for use across routes
-    global DF, FLAGGED, CHARTS
-    FLAGGED = make_flagged(filtered)
-    DF = df
+    with span('make_flagged', len(analysis.df)):
+        FLAGGED = make_flagged(analysis.filtered)
+    DF = analysis.df
+    g.upload.update(rows=len(analysis.df), file_type=summary.get('file_type'))
+    UPLOAD = dict(g.upload)
     
-    door_events_chart = plot_door_histogram(door_events_original) 
+    with span('door_histogram', len(package[1])):
+        door_events_chart = plot_door_histogram(package[1]) 
     CHARTS['Door Events'] = door_events_chart
     
     return jsonify(summary)
@@ -97,6 +233,7 @@ def process_file():
 @main.route('/visualizations', methods=['POST', 'GET'])
 def visualizations():
     global DF, FLAGGED, CHARTS
+    g.upload = UPLOAD
     
     if DF is None:
         return jsonify({"error": "No data available for visualizations"}), 400
@@ -123,8 +260,10 @@ def visualizations():
     # Only add flagged charts if FLAGGED is valid
     if FLAGGED is not None and not FLAGGED.empty:
         try:
-            response["sensor_values"] = plot_sensor_values(sensor_values_df, FLAGGED)  # type: ignore
-            response["sensor_trends"] = plot_sensor_trends(sensor_trends_df, FLAGGED)  # type: ignore
+            with span('sensor_values_chart', len(sensor_values_df)):
+                response["sensor_values"] = plot_sensor_values(sensor_values_df, FLAGGED)  # type: ignore
+            with span('sensor_trends_chart', len(sensor_trends_df)):
+                response["sensor_trends"] = plot_sensor_trends(sensor_trends_df, FLAGGED)  # type: ignore
             CHARTS['Sensor Values'] = response["sensor_values"]
             CHARTS['Sensor Trends'] = response["sensor_trends"]
         except Exception as e:
@@ -132,19 +271,22 @@ def visualizations():
 
     # Other charts
     try:
-        response["trend_issues_altair"] = plot_trend_issue_altair(DF).to_dict(format='vega') #type: ignore
+        with span('trend_issues_chart', len(DF)):
+            response["trend_issues_altair"] = plot_trend_issue_altair(DF).to_dict(format='vega') #type: ignore
     except Exception as e:
         response["trend_issues_altair"] = {}
         import logging; logging.exception("Failed to generate trend issues chart")
 
     try:
-        response["tc10_chart"] = plot_tc10(DF).to_dict(format='vega') #type: ignore
+        with span('tc10_chart', len(DF)):
+            response["tc10_chart"] = plot_tc10(DF).to_dict(format='vega') #type: ignore
     except Exception as e:
         response["tc10_chart"] = {}
         import logging; logging.exception("Failed to generate TC10 chart")
 
     try:
-        response["tc1_tc6_chart"] = plot_tc1_tc6(DF).to_dict(format='vega')
+        with span('tc1_tc6_chart', len(DF)):
+            response["tc1_tc6_chart"] = plot_tc1_tc6(DF).to_dict(format='vega')
     except Exception as e:
         response["tc1_tc6_chart"] = {}
         import logging; logging.exception("Failed to generate TC1-TC6 chart")
@@ -152,7 +294,8 @@ def visualizations():
     # Door Events handled safely
     door_events_chart = CHARTS.get('Door Events')
     if door_events_chart is not None and hasattr(door_events_chart, 'to_dict'):
-        response["door events"] = door_events_chart.to_dict(format='vega')
+        with span('door_events_chart'):
+            response["door events"] = door_events_chart.to_dict(format='vega')
     else:
         response["door events"] = {}
 
@@ -164,6 +307,7 @@ def download_word():
     print("Downloading.......")
 
     start = time.perf_counter()
+    g.upload = UPLOAD
 
     data = request.get_json()
     doc = Document()
@@ -236,5 +380,6 @@ def download_word():
 
     end = time.perf_counter()
     print(f"Total download time = {end - start}")
+    record('download_word', end - start)
 
     return response
\ No newline at end of file
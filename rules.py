@@ -0,0 +1,195 @@
+# rule engine shared by the STP (predictions.py) and TSX (tsx_predictions.py) rule tables
+import operator
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+from .labels import DEFAULT_FLAG, DOOR_IGNORED_FLAG, RULE_LABELS, label_codes, issue_labels
+
+OPERATORS = {
+    '==': operator.eq, '!=': operator.ne,
+    '>': operator.gt, '>=': operator.ge,
+    '<': operator.lt, '<=': operator.le,
+}
+
+# operands computed from several columns; a missing column raises KeyError
+DERIVED_OPERANDS = {
+    'mean(TC3, TC4)': lambda df: df[['TC3', 'TC4']].mean(axis=1),
+    'abs(TC3 - TC4)': lambda df: abs(df['TC3'] - df['TC4']),
+    'mean(Stage 1 RPM, Stage 2 RPM)': lambda df: df[['Stage 1 RPM', 'Stage 2 RPM']].mean(axis=1),
+}
+# the columns each derived operand reads
+DERIVED_OPERAND_COLUMNS = {
+    'mean(TC3, TC4)': ('TC3', 'TC4'),
+    'abs(TC3 - TC4)': ('TC3', 'TC4'),
+    'mean(Stage 1 RPM, Stage 2 RPM)': ('Stage 1 RPM', 'Stage 2 RPM'),
+}
+
+# a stage's rules only apply when its gate holds for a sustained stretch of the file (is_sustained)
+STAGE_GATES = {
+    'first_stage': ('TC10', '>', -35),   # sustained warming
+    'second_stage': ('TC10', '<', -45),  # sustained cooling
+}
+
+# predicates several rules start from
+RTD_WARMING = [('RTD_in_range', '==', False), ('RTD_trend', '>', 0)]
+TC3_TC4_CONNECTED = [
+    ('mean(TC3, TC4)', '!=', 0), ('mean(TC3, TC4)', '!=', -127), ('mean(TC3, TC4)', '!=', 127)
+]
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Trend_Flag label of the rows matching when: any of its clauses, a clause being all
+    of its (operand, op, value) predicates.
+
+    operand is a DERIVED_OPERANDS name, a context scalar or a column (0 when the column
+    is missing, like get_column_safe). value is a number, a context scalar name, or a
+    (name, offset) pair for scalar + offset.
+    """
+    label: str
+    stage: str
+    when: list
+
+@dataclass
+class RulePlan:
+    """
+    Rules in priority order, each clause as indices into the deduplicated predicates.
+    codes are the registry codes of the labels, followed by the one of DEFAULT_FLAG.
+    """
+    labels: list[str]
+    stages: list[str]
+    clauses: list[list[tuple[int, ...]]]
+    predicates: list[tuple]
+    codes: np.ndarray
+
+def compile_rules(rules: list[Rule]) -> RulePlan:
+    unregistered = [rule.label for rule in rules if rule.label not in RULE_LABELS]
+    if unregistered:
+        raise ValueError(f"Rule labels missing from labels.RULE_LABELS: {unregistered}")
+
+    predicates, index = [], {}
+    clauses = []
+    for rule in rules:
+        rule_clauses = []
+        for clause in rule.when:
+            ids = []
+            for predicate in clause:
+                if predicate not in index:
+                    index[predicate] = len(predicates)
+                    predicates.append(predicate)
+                ids.append(index[predicate])
+            rule_clauses.append(tuple(ids))
+        clauses.append(rule_clauses)
+    labels = [rule.label for rule in rules]
+    return RulePlan(labels, [rule.stage for rule in rules], clauses, predicates, label_codes(labels + [DEFAULT_FLAG]))
+
+def plan_columns(plan: RulePlan) -> list[str]:
+    """Every column the plan's predicates can read, present in a frame or not."""
+    columns = []
+    for name, _, _ in plan.predicates:
+        columns.extend(DERIVED_OPERAND_COLUMNS.get(name, (name,)))
+    return list(dict.fromkeys(columns))
+
+def pack_bits(flags: np.ndarray) -> np.ndarray:
+    """Bool array as a bitset of uint64 words (np.packbits, zero padded to whole words)."""
+    packed = np.packbits(flags)
+    words = np.zeros(-(-packed.size // 8) * 8, dtype=np.uint8)
+    words[:packed.size] = packed
+    return words.view(np.uint64)
+
+def unpack_bits(words: np.ndarray, n: int) -> np.ndarray:
+    return np.unpackbits(words.view(np.uint8), count=n).view(bool)
+
+class _Evaluation:
+    # operands and predicate bitsets of one frame, each computed once
+
+    def __init__(self, df: pd.DataFrame, context: dict):
+        self.df = df
+        self.context = context
+        self.operands = {}
+        self.bitsets = {}
+
+    def operand(self, name):
+        if name not in self.operands:
+            if name in DERIVED_OPERANDS:
+                value = DERIVED_OPERANDS[name](self.df).to_numpy()
+            elif name in self.context:
+                value = self.context[name]
+            elif name in self.df.columns:
+                value = self.df[name].to_numpy()
+            else:
+                value = 0
+            self.operands[name] = value
+        return self.operands[name]
+
+    def value(self, spec):
+        if isinstance(spec, str):
+            return self.context[spec]
+        if isinstance(spec, tuple):
+            name, offset = spec
+            return self.context[name] + offset
+        return spec
+
+    def compare(self, predicate, rows=None):
+        name, op, value = predicate
+        operand = self.operand(name)
+        if rows is not None and isinstance(operand, np.ndarray):
+            operand = operand[rows]
+        return OPERATORS[op](operand, self.value(value))
+
+    def predicate(self, plan: RulePlan, pid: int, unclaimed: np.ndarray) -> np.ndarray:
+        # evaluated on the rows still unclaimed at its first use; rows only ever shrink as
+        # rules claim them, and every use is masked by the unclaimed bits anyway
+        if pid not in self.bitsets:
+            rows = np.flatnonzero(unpack_bits(unclaimed, len(self.df)))
+            flags = np.zeros(len(self.df), dtype=bool)
+            flags[rows] = self.compare(plan.predicates[pid], rows)
+            self.bitsets[pid] = pack_bits(flags)
+        return self.bitsets[pid]
+
+def stage_gates(plan: RulePlan, df: pd.DataFrame, context: dict | None = None) -> dict[str, bool]:
+    """Whether each gated stage of the plan applies to df, its gate sustained somewhere in the file."""
+    from .predictions import is_sustained  # predictions imports this module for its rule table
+
+    evaluation = _Evaluation(df, context or {})
+    return {
+        stage: is_sustained(df, evaluation.compare(STAGE_GATES[stage]))
+        for stage in dict.fromkeys(plan.stages) if stage in STAGE_GATES
+    }
+
+def evaluate_rules(plan: RulePlan, df: pd.DataFrame, context: dict | None = None, gates: dict | None = None) -> pd.Categorical:
+    """
+    Trend_Flag of every row: the label of the first rule (in priority order) that matches
+    it, DEFAULT_FLAG if none does, as a Categorical of the label registry (labels.ISSUE_DTYPE).
+    A rule is only evaluated on rows no earlier rule claimed.
+    Predicates are kept as bitsets, so a clause costs one AND per 64 rows and a rule one OR.
+    gates (see stage_gates) default to df's own; a time shard of a file gets the file's.
+    """
+    from .predictions import is_sustained  # predictions imports this module for its rule table
+
+    evaluation = _Evaluation(df, context or {})
+    codes = np.full(len(df), len(plan.labels), dtype=np.intp)
+    unclaimed = pack_bits(np.ones(len(df), dtype=bool))
+    gates = dict(gates or {})
+
+    for code, (stage, clauses) in enumerate(zip(plan.stages, plan.clauses)):
+        if not unclaimed.any():
+            break
+        if stage in STAGE_GATES:
+            if stage not in gates:
+                gates[stage] = is_sustained(df, evaluation.compare(STAGE_GATES[stage]))
+            if not gates[stage]:
+                continue
+
+        matched = np.zeros_like(unclaimed)
+        for clause in clauses:
+            hit = unclaimed.copy()
+            for pid in clause:
+                hit &= evaluation.predicate(plan, pid, unclaimed)
+            matched |= hit
+
+        codes[unpack_bits(matched, len(df))] = code
+        unclaimed &= ~matched
+
+    return issue_labels(plan.codes[codes])
\ No newline at end of file
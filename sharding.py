@@ -0,0 +1,170 @@
+# the zigzag, rules and sustained runs of a long export, evaluated in contiguous time shards on
+# worker processes; the shards read their rows from one shared memory copy of the columns
+import os
+import threading
+import multiprocessing
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+
+from .labels import issue_labels
+from .rules import RulePlan, evaluate_rules, plan_columns, stage_gates
+from .predictions import zigzag_rows, flag_sustained, sustained_window
+from .profiling import profiling_request
+
+# shorter frames (about 90 days at one row a minute) aren't worth a process pool
+DEFAULT_MIN_SHARD_ROWS = 1 << 17
+
+_workers = None  # None for one per CPU
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+def set_rule_workers(workers: int | None) -> None:
+    """Worker processes sharding the rules of one export; 1 (or 0) evaluates every frame in one pass."""
+    global _workers, _pool
+    with _lock:
+        _workers = workers
+        # a forked child inherits the pool object but none of its processes
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False)
+        _pool = None
+
+def _worker_count() -> int:
+    return _workers if _workers is not None else (os.cpu_count() or 1)
+
+def rule_pool() -> ProcessPoolExecutor | None:
+    """
+    The long-lived pool of shard workers, None when every frame is evaluated in one pass. It is
+    started by the first sharded flag_rows. Its workers start from a forkserver (spawn where there
+    is none), so they are never forked from a server running request and stage threads.
+    """
+    global _pool, _pool_pid
+    with _lock:
+        workers = _worker_count()
+        if workers <= 1:
+            return None
+        if _pool is None or _pool_pid != os.getpid():
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                # imported once in the server, every worker forked from it starts with pandas loaded
+                context.set_forkserver_preload(['__main__', __name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(workers, mp_context=context)
+            _pool_pid = os.getpid()
+        return _pool
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def shard_count(rows: int, min_shard_rows=DEFAULT_MIN_SHARD_ROWS) -> int:
+    return max(1, min(_worker_count(), rows // min_shard_rows))
+
+def shard_bounds(rows: int, shards: int, overlap: int) -> list[tuple[int, int, int, int]]:
+    """(start, stop) of each shard's own rows, then of the rows it reads: overlap more on each side."""
+    edges = np.linspace(0, rows, shards + 1).astype(int)
+    return [
+        (start, stop, max(start - overlap, 0), min(stop + overlap, rows))
+        for start, stop in zip(edges[:-1], edges[1:])
+    ]
+
+@dataclass
+class SharedColumns:
+    """Handle of columns copied into one shared memory block, picklable for the worker processes."""
+    name: str
+    rows: int
+    layout: list[tuple[str, str, int]]  # column, dtype, byte offset
+
+    def frame(self, start: int, stop: int) -> pd.DataFrame:
+        """Copy of rows start:stop, so the block can be closed at once."""
+        block = SharedMemory(name=self.name)
+        try:
+            columns = {}
+            for col, dtype, offset in self.layout:
+                values = np.ndarray((self.rows,), dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+                columns[col] = values[start:stop].copy()
+                del values
+        finally:
+            block.close()
+        return pd.DataFrame(columns)
+
+def share_columns(df: pd.DataFrame, columns) -> tuple[SharedColumns, SharedMemory] | None:
+    """The columns in a new shared memory block, None if one of them has no fixed-width dtype."""
+    arrays = {col: df[col].to_numpy() for col in columns}
+    if any(values.dtype.hasobject for values in arrays.values()):
+        return None
+
+    layout, size = [], 0
+    for col, values in arrays.items():
+        layout.append((col, values.dtype.str, size))
+        size += -(-values.nbytes // 8) * 8  # every column starts 8-byte aligned
+    block = SharedMemory(create=True, size=max(size, 1))
+    for (col, dtype, offset), values in zip(layout, arrays.values()):
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf, offset=offset)[:] = values
+    return SharedColumns(block.name, len(df), layout), block
+
+def _evaluate_shard(shared: SharedColumns, plan: RulePlan, trend_cols, context, gates, window, bounds):
+    start, stop, read_start, read_stop = bounds
+    df = shared.frame(read_start, read_stop)
+    df['TC_zigzag'] = zigzag_rows(df[trend_cols].to_numpy())
+    flags = evaluate_rules(plan, df, context, gates)
+    # a run crossing into the overlap is seen whole up to the window, which is all its length is compared to
+    sustained = flag_sustained(pd.DataFrame({'Trend_Flag': flags}), min_consecutive=window)
+    own = slice(start - read_start, stop - read_start)
+    return df['TC_zigzag'].to_numpy()[own], flags.codes[own], sustained[own]
+
+def _evaluate_shards(handle: SharedColumns, plan: RulePlan, trend_cols, context, gates, window, bounds):
+    # the shards' results in order, None if the pool broke
+    pool = rule_pool()
+    try:
+        futures = [
+            pool.submit(_evaluate_shard, handle, plan, trend_cols, context, gates, window, shard)
+            for shard in bounds
+        ]
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        # a shard worker died, the next long export gets a new pool
+        _discard_pool(pool)
+        return None
+
+def flag_rows(plan: RulePlan, df: pd.DataFrame, trend_cols, context=None, min_shard_rows=DEFAULT_MIN_SHARD_ROWS):
+    """
+    Set df['TC_zigzag'] (zigzag_rows of trend_cols) and return the Trend_Flag and Sustained_Issue
+    of every row. A long frame is cut into contiguous time shards evaluated on the rule pool,
+    each also reading the sustained window of rows past both of its ends so runs crossing a
+    boundary keep their full length. The stage gates hold for the whole file, so they are taken
+    once up front; the result equals the one-pass evaluation exactly, which a profiled request
+    (whose profile only follows its own thread) or a broken pool falls back to.
+    """
+    window = sustained_window()
+    shards = 1 if profiling_request() else shard_count(len(df), min_shard_rows)
+    results = None
+    if shards > 1:
+        columns = [col for col in dict.fromkeys([*trend_cols, *plan_columns(plan)]) if col in df.columns]
+        shared = share_columns(df, columns)
+        if shared is not None:
+            handle, block = shared
+            try:
+                gates = stage_gates(plan, df, context)
+                bounds = shard_bounds(len(df), shards, window - 1)
+                results = _evaluate_shards(handle, plan, trend_cols, context, gates, window, bounds)
+            finally:
+                block.close()
+                block.unlink()
+
+    if results is None:
+        df['TC_zigzag'] = zigzag_rows(df[trend_cols].to_numpy())
+        flags = evaluate_rules(plan, df, context)
+        return flags, flag_sustained(pd.DataFrame({'Trend_Flag': flags}), min_consecutive=window)
+
+    zigzag, codes, sustained = (np.concatenate(parts) for parts in zip(*results))
+    df['TC_zigzag'] = zigzag
+    return issue_labels(codes), sustained
\ No newline at end of file
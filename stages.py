@@ -0,0 +1,83 @@
+# independent stages of one upload run concurrently on a shared thread pool, each joined
+# only where its result is needed; pandas' parsers and numpy kernels release the GIL
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .tracing import span, current_spans
+from .profiling import profiling_request
+
+DEFAULT_STAGE_WORKERS = min(4, os.cpu_count() or 1)
+
+_workers = DEFAULT_STAGE_WORKERS
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+def set_stage_workers(workers: int | None) -> None:
+    """Threads of the stage pool; 1 (or 0) runs every stage inline, as in the worker processes of a fleet."""
+    global _workers, _pool
+    with _lock:
+        _workers = DEFAULT_STAGE_WORKERS if workers is None else workers
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+def stage_pool() -> ThreadPoolExecutor | None:
+    global _pool, _pool_pid
+    with _lock:
+        if _workers <= 1:
+            return None
+        # a forked child inherits the pool object but none of its threads
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix='puc-stage')
+            _pool_pid = os.getpid()
+        return _pool
+
+def submit(stage: str, func, *args) -> Future:
+    """
+    Run func(*args) as a tracing span on the stage pool. Futures among args are its
+    dependencies: func is scheduled once they are done, with their results in their place,
+    and fails with their exception if one failed. The stages of a profiled request run
+    inline, on the thread its profile covers.
+    """
+    spans = current_spans()
+    inline = profiling_request()
+    result = Future()
+    dependencies = [arg for arg in args if isinstance(arg, Future)]
+    remaining = [len(dependencies)]
+    remaining_lock = threading.Lock()
+
+    def run():
+        try:
+            values = [arg.result() if isinstance(arg, Future) else arg for arg in args]
+            with span(stage, spans=spans):
+                value = func(*values)
+        except BaseException as e:
+            result.set_exception(e)
+        else:
+            result.set_result(value)
+
+    def launch():
+        pool = None if inline else stage_pool()
+        if pool is None:
+            run()
+        else:
+            pool.submit(run)
+
+    def dependency_done(_):
+        with remaining_lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        launch()
+
+    if not dependencies:
+        launch()
+    for dependency in dependencies:
+        dependency.add_done_callback(dependency_done)
+    return result
+
+def resolve(value):
+    # a stage's result where it is needed, anything else as is
+    return value.result() if isinstance(value, Future) else value
\ No newline at end of file
@@ -113,10 +113,11 @@ if (dropArea) {
   }
 
   function handleFiles(files) {
-    const file = files[0];
-    if (file) {
-      if (fileName) fileName.textContent = file.name;
-      if (fileSize) fileSize.textContent = (file.size / (1024 * 1024)).toFixed(1) + " MB";
+    files = Array.from(files);
+    if (files.length > 0) {
+      const totalSize = files.reduce((sum, f) => sum + f.size, 0);
+      if (fileName) fileName.textContent = files.map(f => f.name).join(", ");
+      if (fileSize) fileSize.textContent = (totalSize / (1024 * 1024)).toFixed(1) + " MB";
       if (fileInfo) fileInfo.classList.remove("hidden");
       if (successMsg) successMsg.classList.remove("hidden");
     }
@@ -142,11 +143,12 @@ if (toggleButton) {
 
 if (fileUpload) {
   fileUpload.addEventListener("change", () => {
-    const file = fileUpload.files[0];
+    const files = Array.from(fileUpload.files);
 
-    if (file) {
-      if (fileName) fileName.textContent = file.name;
-      if (fileSize) fileSize.textContent = (file.size / (1024 * 1024)).toFixed(1) + " MB";
+    if (files.length > 0) {
+      const totalSize = files.reduce((sum, f) => sum + f.size, 0);
+      if (fileName) fileName.textContent = files.map(f => f.name).join(", ");
+      if (fileSize) fileSize.textContent = (totalSize / (1024 * 1024)).toFixed(1) + " MB";
       if (fileInfo) fileInfo.classList.remove("hidden");
       if (successMsg) successMsg.classList.remove("hidden");
     }
@@ -541,15 +543,16 @@ const uploadFormElement = document.getElementById("upload-form");
 if (uploadFormElement) {
   uploadFormElement.addEventListener("submit", function (e) {
     e.preventDefault();
-    const file = fileUpload ? fileUpload.files[0] : null;
+    const files = fileUpload ? Array.from(fileUpload.files) : [];
 
-    if (!file) {
+    if (files.length === 0) {
       alert("Please upload a file first.");
       return;
     }
 
+    // consecutive exports of one freezer are analysed together
     const formData = new FormData();
-    formData.append("file", file);
+    files.forEach(f => formData.append("file", f));
 
     // Show spinner and start countdown
     if (processing) processing.classList.remove("hidden");
@@ -1,40 +1,65 @@
 # this file is meant to generate summary and the generate_summary() function is exported
+import os
 from turtle import st
+import numpy as np
 import pandas as pd
 from .visualizations import get_absolute_df, get_trend_df
+from .preprocessing import DOOR_EVENT_TIME_COLUMNS, column_profile
+from .labels import DEFAULT_FLAG, factorize_labels, not_issue_codes
+from .stages import submit
 
-excel_path = r"C:\TFS Telemetry Production\Final App07_08\Final App\Issues Actual.xlsx"
+POWER_FAILURE_ROOT_CAUSE = "Power Failure Issue Detected"
+
+# conditions, verifications and suggestions of the issues: the workbook shipped with the package,
+# or the one PUC_ISSUES_WORKBOOK names (create_app also sets it from its config)
+excel_path = os.environ.get('PUC_ISSUES_WORKBOOK') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Issues Actual.xlsx')
+
+def set_issues_workbook(path) -> None:
+    global excel_path
+    excel_path = path
 
 # helper functions to set variables
 def set_trend_dict(df: pd.DataFrame, tcs_list: dict) -> dict:
     trends = {}
+    profile = column_profile(df, [f'{tc}_trend' for tc in tcs_list])
     for tc in tcs_list:
         if tc in df.columns:
-            trends[tc] = 'Decreasing' if df[f'{tc}_trend'].mean() < 0 else 'Increasing'
+            trends[tc] = 'Decreasing' if profile.mean(f'{tc}_trend') < 0 else 'Increasing'
             
     return trends
     
-def get_root_cause(df: pd.DataFrame):
+def get_root_cause(df: pd.DataFrame, column='Trend_Flag'):
     if df.empty:
         root_cause = "Not Applicable"
     
-    if df['Trend_Flag'].notnull().any():
-        final_label = df.loc[
-            ~df['Trend_Flag'].isin([
-                "No issue detected - your device is working properly",
-                "Door Open Event, Ignored"
-            ]),
-            'Trend_Flag'
-        ]
+    if df[column].notnull().any():
+        # most frequent issue code, decoded to its label
+        codes, categories = factorize_labels(df[column])
+        final_label = codes[~np.isin(codes, not_issue_codes(categories))]
 
-        if not final_label.empty:
-            root_cause = final_label.value_counts().idxmax()
+        if final_label.size:
+            root_cause = str(categories[np.bincount(final_label).argmax()])
         else:
-            root_cause = "No issue detected - your device is working properly"
+            root_cause = DEFAULT_FLAG
     else:
         root_cause = "Not Applicable"
     
     return root_cause
+
+def power_failure_alarm_count(power_events_df: pd.DataFrame) -> int:
+    """Power Failure Alarms of all days (per-day counts summed), 0 unless a day had at least 2."""
+    if power_events_df.empty:
+        return 0
+    alarms = power_events_df[power_events_df['Event'] == 'Power Failure Alarm']
+    if not (alarms['Count of This Event on Day'] >= 2).any():
+        return 0
+    return int(alarms['Count of This Event on Day'].sum())
+
+def summary_root_cause(df: pd.DataFrame, power_events_df: pd.DataFrame, column='Trend_Flag') -> str:
+    # repeated power failures take precedence over the telemetry trends
+    if power_failure_alarm_count(power_events_df) >= 2:
+        return POWER_FAILURE_ROOT_CAUSE
+    return get_root_cause(df, column)
 # end of helper functions
 
 # fetches observations
@@ -113,7 +138,7 @@ def event_summary(door_events_df: pd.DataFrame, power_events_df: pd.DataFrame, r
     Door_opening_min_time = 0
     Door_openings_avg_per_day = 0
     last_door_opening = "N/A"
-    power_event_exceeds_threshold_sum = 0
+    power_event_exceeds_threshold_sum = power_failure_alarm_count(power_events_df)
     
     # isolating average door opening time
     if not door_events_df.empty:
@@ -142,8 +167,6 @@ def event_summary(door_events_df: pd.DataFrame, power_events_df: pd.DataFrame, r
 
         if not filtered_df.empty:
             filtered_df['Exceeds Threshold By'] = filtered_df['Count of This Event on Day'] - 1
-            power_events_df_sum = power_events_df[power_events_df['Event'] == 'Power Failure Alarm']
-            power_event_exceeds_threshold_sum = int(power_events_df_sum['Count of This Event on Day'].sum())
             
             # Format each row as "YYYY-MM-DD: N"
             power_summary_lines = [
@@ -163,7 +186,7 @@ def event_summary(door_events_df: pd.DataFrame, power_events_df: pd.DataFrame, r
     duration_df = duration_df.sort_values(['Trend_Flag', 'Date/Time']).reset_index(drop=True)
 
     issue_summaries = []
-    for flag, group in duration_df.groupby('Trend_Flag'):
+    for flag, group in duration_df.groupby('Trend_Flag', observed=True):
         group['block'] = (group['Date/Time'].diff() > pd.Timedelta(minutes=1)).cumsum()
         blocks = (
             group.groupby('block')
@@ -219,9 +242,9 @@ def event_summary(door_events_df: pd.DataFrame, power_events_df: pd.DataFrame, r
     return final_summary, power_event_exceeds_threshold_sum
 
 # generates explanation of root cause
-def generate_cause_explanation(root_cause, excel_path=excel_path):
+def generate_cause_explanation(root_cause, workbook=None):
 
-    data = pd.read_excel(excel_path, sheet_name='Issues')
+    data = pd.read_excel(workbook or excel_path, sheet_name='Issues')
 
     filtered_data = data[data['Issue'] == root_cause]
 
@@ -269,29 +292,41 @@ def generate_cause_explanation(root_cause, excel_path=excel_path):
 # main function to be implemented. Import this wherever required
 def generate_summary(df: pd.DataFrame, door_events_df: pd.DataFrame, power_events_df: pd.DataFrame, 
                      original_door_df: pd.DataFrame, tcs_list: dict[str, tuple], ref_df: pd.DataFrame,
-                     duration_df: pd.DataFrame
+                     duration_df: pd.DataFrame, root_cause: str | None = None
                     ):
     
-    events, sum_power_threshold = event_summary(original_door_df, power_events_df, ref_df, duration_df)
-    
-    root_cause = get_root_cause(df) if sum_power_threshold < 2 else "Power Failure Issue Detected"
+    if root_cause is None:
+        root_cause = summary_root_cause(df, power_events_df)
     
+    # profiles the trend columns into df.attrs, before the blocks below copy slices of df
     trends = set_trend_dict(df, tcs_list)
     
-    absolute_df = get_absolute_df(df)
+    # independent blocks on the stage pool, joined below; the Excel lookups are the slow ones
+    events = submit('event_summary', event_summary, original_door_df, power_events_df, ref_df, duration_df)
+    absolute_df = submit('absolute_df', get_absolute_df, df)
+    trend_df = submit('trend_df', get_trend_df, df)
+    observation = submit('observation', get_observation, df, trends, root_cause)
+    cause_explanation = submit('cause_explanation', generate_cause_explanation, root_cause)
+    
+    events, _ = events.result()
+    
+    absolute_df = absolute_df.result()
     absolute_df = absolute_df[absolute_df['Mean'] != 0]
     
-    trend_df = get_trend_df(df)
+    trend_df = trend_df.result()
     trend_df = trend_df[trend_df['Mean'] != 0]
     
     # this will be our title
     title = "📊 GenAI Summary: Telemetry-Based Preventive Maintenance Analysis"
     
     # observation block
-    observation = get_observation(df, trends, root_cause)
+    observation = observation.result()
     
     # door summary text
-    door_events_summary = door_events_df.to_dict(orient='records') if not door_events_df.empty else []
+    door_events_summary = (
+        door_events_df.drop(columns=DOOR_EVENT_TIME_COLUMNS, errors='ignore').to_dict(orient='records')
+        if not door_events_df.empty else []
+    )
     
     # event summary text
     power_events_summary = power_events_df.to_dict(orient='records') if not power_events_df.empty else []
@@ -300,7 +335,7 @@ def generate_summary(df: pd.DataFrame, door_events_df: pd.DataFrame, power_event
     ref_events_df = ref_df.to_dict(orient="records") if not ref_df.empty else []
     
     # cause explanation block
-    cause_explanation = generate_cause_explanation(root_cause)
+    cause_explanation = cause_explanation.result()
 
     return {
         "title": title,
@@ -0,0 +1,242 @@
+# synthetic PUC exports for benchmarks and backtests without device data,
+# write one with: python -m <package>.synthetic OUT [--days 90] [--layout TSX] [--fault first_stage_leak]
+import os
+import sys
+import argparse
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+from .preprocessing import PUC_COLUMNS, DOOR_EVENTS, REFRIGERATION_EVENT
+
+MINUTES_PER_DAY = 24 * 60
+LAYOUTS = ('STP', 'STP1', 'TSX')
+
+TELEMETRY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+EVENT_TIME_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+
+# door open durations (seconds) and how often each occurs
+DOOR_OPEN_SECONDS = (20, 45, 90, 400, 3000)
+DOOR_OPEN_WEIGHTS = (0.35, 0.3, 0.2, 0.1, 0.05)
+
+# steady state of a healthy freezer: column -> (level, noise sd, daily swing), inside the
+# feature_engineering bands so the trends stay flat outside the injected faults
+HEALTHY = {
+    'RTD': (-80, 0.3, 0), 'TC1': (-17.5, 0.6, 0.5), 'TC2': (20, 1.2, 2), 'TC3': (-91, 1.2, 0),
+    'TC4': (-91, 1.2, 0), 'TC6': (-25, 1.2, 1), 'TC7': (20, 1.2, 2), 'TC8': (45, 1.2, 1),
+    'TC9': (45, 2, 0), 'TC10': (-40, 1.2, 2), 'Voltage': (230, 1, 0), 'BUS RTD': (-80, 0.4, 0),
+}
+CONSTANT = {
+    'Setpoint': -80, 'User Offset': 0, 'Warm Warning setpoint': -70, 'Cold Warning setpoint': -90,
+    'HxHxRec': 1, 'VscRefStageMSB': 0, 'VscRefStageLSB': 0,
+}
+# sensors a layout exports as the sentinel -127 (check_file_type tells the layouts apart by them)
+DISCONNECTED = {'STP': (), 'STP1': ('TC3', 'TC4', 'TC7', 'TC9'), 'TSX': ('TC8',)}
+
+@dataclass(frozen=True)
+class Fault:
+    """Column levels held over a window, and the root cause the rule tables give them."""
+    root_cause: str
+    levels: dict
+    layouts: tuple = LAYOUTS
+
+FAULTS = {
+    'first_stage_leak': Fault("1st stage leak issue", {'RTD': -72, 'TC10': -30, 'TC1': 0, 'TC8': 58}, ('STP', 'TSX')),
+    'second_stage_leak': Fault(
+        "2nd stage leak issue",
+        {'RTD': -72, 'TC10': -50, 'TC1': -25, 'TC3': -100, 'TC4': -80, 'TC6': -15},
+        ('STP', 'TSX'),
+    ),
+    'first_stage_hot_sump': Fault("1st stage hot sump", {'TC8': 72}, ('STP', 'STP1')),
+    'second_stage_hot_sump': Fault("2nd stage hot sump", {'TC9': 72}, ('STP', 'TSX')),
+    'hslc': Fault("HSLC", {'Stage 1 RPM': 4500, 'Stage 2 RPM': 4500}, ('TSX',)),
+    # a burst of power failure alarms on one day of the window, no telemetry signature
+    'power_failure': Fault("Power Failure Issue Detected", {}),
+}
+FAULT_DAYS = 2.0
+
+@dataclass
+class SyntheticSpec:
+    days: float = 60
+    layout: str = 'STP'
+    faults: tuple = ()  # names in FAULTS, injected one after the other across the file
+    seed: int = 0
+    start: str = '2025-01-01'
+    serial: str = 'SYN0001'
+    exports: int = 1  # PUC_VER header lines, as when several exports are concatenated
+    door_openings_per_day: float = 4
+    power_glitches_per_day: float = 0.2
+    power_failures_per_day: float = 0.02
+    refrigeration_failures_per_day: float = 0.05
+    malformed_per_day: float = 0.5
+    fault_windows: list = field(default_factory=list, init=False)  # (name, first row, end row)
+
+    @property
+    def rows(self) -> int:
+        return int(self.days * MINUTES_PER_DAY)
+
+    @property
+    def root_cause(self) -> str | None:
+        """Root cause of the first (and longest) injected fault, what a backtest manifest would hold."""
+        return FAULTS[self.faults[0]].root_cause if self.faults else None
+
+def _fault_windows(spec: SyntheticSpec) -> list[tuple[str, int, int]]:
+    # evenly spread and never overlapping; the first fault lasts twice as long as the others
+    n = spec.rows
+    base = max(min(int(FAULT_DAYS * MINUTES_PER_DAY), n // (2 * (len(spec.faults) + 1))), 1)
+    windows = []
+    for i, name in enumerate(spec.faults):
+        if name not in FAULTS:
+            raise ValueError(f"Unknown fault {name!r}, expected one of {sorted(FAULTS)}")
+        if spec.layout not in FAULTS[name].layouts:
+            raise ValueError(f"Fault {name!r} has no {spec.layout} signature")
+        length = 2 * base if i == 0 else base
+        start = int(n * (i + 1) / (len(spec.faults) + 1)) - length // 2
+        windows.append((name, max(start, 0), min(max(start, 0) + length, n)))
+    return windows
+
+def synthetic_frame(spec: SyntheticSpec) -> pd.DataFrame:
+    """Telemetry rows of the export at 1-minute resolution, in PUC_COLUMNS order."""
+    if spec.layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {spec.layout!r}, expected one of {LAYOUTS}")
+    rng = np.random.default_rng(spec.seed)
+    n = spec.rows
+    daily = np.sin(2 * np.pi * np.arange(n) / MINUTES_PER_DAY)
+
+    columns = {'Date/Time': pd.date_range(spec.start, periods=n, freq='min')}
+    for col, (level, sd, swing) in HEALTHY.items():
+        columns[col] = (level + swing * daily + rng.normal(0, sd, n)).astype(np.float32)
+    for col, value in CONSTANT.items():
+        columns[col] = np.full(n, value, dtype=np.int16)
+    columns['PUC_State'] = rng.integers(0, 2, n, dtype=np.int8)
+    columns['Fan State'] = rng.integers(0, 2, n, dtype=np.int8)
+    columns['RSSI'] = rng.integers(-90, -40, n, dtype=np.int16)
+    columns['latency'] = rng.integers(0, 50, n, dtype=np.int16)
+
+    if spec.layout == 'TSX':
+        # variable speed compressors, always running below the HSLC speed
+        for col in ('Stage 1 RPM', 'Stage 2 RPM'):
+            columns[col] = (3200 + 300 * daily + rng.normal(0, 100, n)).astype(np.int16)
+    else:
+        columns['Stage 1 RPM'] = np.zeros(n, dtype=np.int16)
+        columns['Stage 2 RPM'] = np.zeros(n, dtype=np.int16)
+    for col in DISCONNECTED[spec.layout]:
+        columns[col] = np.full(n, -127, dtype=np.float32)
+
+    spec.fault_windows = _fault_windows(spec)
+    for name, start, end in spec.fault_windows:
+        for col, level in FAULTS[name].levels.items():
+            if col in DISCONNECTED[spec.layout]:
+                continue
+            noise = rng.normal(0, 0.5, end - start) if columns[col].dtype.kind == 'f' else 0
+            columns[col][start:end] = level + noise
+
+    return pd.DataFrame(columns, columns=PUC_COLUMNS)
+
+def _event_rows(rng, n: int, per_day: float) -> np.ndarray:
+    return np.sort(rng.choice(n, size=min(rng.poisson(per_day * n / MINUTES_PER_DAY), n), replace=False))
+
+def synthetic_events(spec: SyntheticSpec, times: pd.DatetimeIndex) -> list[tuple[int, str]]:
+    """(row, line) of the event and malformed lines, each written after the telemetry row it follows."""
+    rng = np.random.default_rng(spec.seed + 1)
+    n = len(times)
+    events = []
+
+    def stamp(t):
+        return t.strftime(EVENT_TIME_FORMAT)
+
+    for row in _event_rows(rng, n, spec.door_openings_per_day):
+        opened = times[row] + pd.Timedelta(seconds=int(rng.integers(0, 60)))
+        closed = opened + pd.Timedelta(seconds=int(rng.choice(DOOR_OPEN_SECONDS, p=DOOR_OPEN_WEIGHTS)))
+        events.append((row, f"{stamp(opened)}, {DOOR_EVENTS[0]}"))
+        events.append((min(row + int((closed - times[row]).total_seconds() // 60), n - 1), f"{stamp(closed)}, {DOOR_EVENTS[1]}"))
+    for row in _event_rows(rng, n, spec.power_glitches_per_day):
+        events.append((row, f"{stamp(times[row])}, Power Glitch"))
+    for row in _event_rows(rng, n, spec.power_failures_per_day):
+        events.append((row, f"{stamp(times[row])}, Power Failure Alarm"))
+    for row in _event_rows(rng, n, spec.refrigeration_failures_per_day):
+        events.append((row, f"{stamp(times[row])}, {REFRIGERATION_EVENT}"))
+
+    for name, start, end in spec.fault_windows:
+        if name == 'power_failure':
+            # several alarms within the first hour of the window, so on one day
+            for row in np.sort(rng.choice(np.arange(start, min(start + 60, end)), size=min(4, end - start), replace=False)):
+                events.append((row, f"{stamp(times[row])}, Power Failure Alarm"))
+
+    # garbage and lines cut short in transfer
+    for row in _event_rows(rng, n, spec.malformed_per_day):
+        events.append((row, rng.choice(["ERR,,", "\x00\x00", f"{times[row].strftime(TELEMETRY_TIME_FORMAT)},-80.1,-1"])))
+
+    events.sort(key=lambda event: event[0])
+    return events
+
+def write_puc(out, spec: SyntheticSpec, chunk_rows=1 << 16) -> dict:
+    """
+    Write the export to a path or binary stream, chunk_rows telemetry rows at a time, and
+    return its line counts. The spec's fault_windows are filled in.
+    """
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, 'wb') as f:
+            return write_puc(f, spec, chunk_rows)
+
+    df = synthetic_frame(spec)
+    events = synthetic_events(spec, pd.DatetimeIndex(df['Date/Time']))
+    event_rows = np.array([row for row, _ in events], dtype=np.int64)
+    headers = set(np.linspace(0, len(df), spec.exports, endpoint=False).astype(int).tolist())
+    counts = {'telemetry': len(df), 'events': len(events), 'headers': len(headers)}
+
+    next_event = 0
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        lines = chunk.to_csv(
+            header=False, index=False, float_format='%.1f', date_format=TELEMETRY_TIME_FORMAT, lineterminator='\n'
+        ).split('\n')[:-1]
+
+        out_lines = []
+        stop = np.searchsorted(event_rows, start + len(chunk))
+        for i, line in enumerate(lines):
+            if start + i in headers:
+                out_lines.append(f"PUC_VER 1.2.3,{spec.serial}")
+            out_lines.append(line)
+            while next_event < stop and event_rows[next_event] == start + i:
+                out_lines.append(events[next_event][1])
+                next_event += 1
+        out.write(('\n'.join(out_lines) + '\n').encode())
+    return counts
+
+def synthetic_puc(spec: SyntheticSpec) -> bytes:
+    """The whole export as bytes, e.g. for preprocess_puc_file."""
+    from io import BytesIO
+    buffer = BytesIO()
+    write_puc(buffer, spec)
+    return buffer.getvalue()
+
+def write_corpus(directory, specs: list[SyntheticSpec]) -> str:
+    """One export per spec plus the manifest.csv the backtest reads; returns the manifest path."""
+    os.makedirs(directory, exist_ok=True)
+    rows = []
+    for i, spec in enumerate(specs):
+        filename = f"{i:04d}_{spec.layout}_{'-'.join(spec.faults) or 'healthy'}.puc"
+        write_puc(os.path.join(directory, filename), spec)
+        rows.append({'file': filename, 'root_cause': spec.root_cause or "No issue detected - your device is working properly"})
+    manifest = os.path.join(directory, 'manifest.csv')
+    pd.DataFrame(rows).to_csv(manifest, index=False)
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic PUC export.")
+    parser.add_argument('out', help="file to write")
+    parser.add_argument('--days', type=float, default=60, help="length at 1-minute resolution (1 to 730)")
+    parser.add_argument('--layout', choices=LAYOUTS, default='STP')
+    parser.add_argument('--fault', action='append', default=[], choices=sorted(FAULTS), help="repeatable")
+    parser.add_argument('--exports', type=int, default=1, help="concatenated exports (PUC_VER headers)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    spec = SyntheticSpec(days=args.days, layout=args.layout, faults=tuple(args.fault), seed=args.seed, exports=args.exports)
+    counts = write_puc(args.out, spec)
+    print(f"Wrote {args.out}: {counts}, expected root cause: {spec.root_cause or 'none'}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,32 @@
+# random frames with every column the STP and TSX rules read, shared by the rule tests
+import numpy as np
+import pandas as pd
+
+from ..predictions import zigzag_rows
+
+TREND_CHANNELS = ['TC1', 'TC2', 'TC3', 'TC4', 'TC6', 'TC7', 'TC8', 'TC9', 'TC10', 'RTD']
+
+def rule_frame(rows: int, seed: int, tc10=None) -> pd.DataFrame:
+    """
+    Readings near the rule thresholds (sentinels, sump limits, RPM limits) and -1/1 trends, so
+    every predicate is both true and false on many rows. tc10 defaults to a slow swing between
+    sustained warming and sustained cooling, a scalar holds it constant.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Date/Time': pd.date_range('2025-01-01', periods=rows, freq='min')})
+    for tc in ['TC1', 'TC2', 'TC3', 'TC4', 'TC6', 'TC7', 'TC8', 'TC9']:
+        values = rng.choice([-127, 0, 127, -90, -20, 20, 69, 70, 75, -91.5], rows).astype(np.float32)
+        df[tc] = values + rng.normal(0, 3, rows).astype(np.float32) * (rng.random(rows) < 0.5)
+    df.loc[rng.random(rows) < 0.02, 'TC3'] = np.nan
+    swing = -40 + 10 * np.sin(np.arange(rows) / 300)
+    df['TC10'] = np.float32(swing if tc10 is None else tc10)
+    for tc in TREND_CHANNELS:
+        df[f'{tc}_trend'] = rng.choice(np.array([-1, 0, 1], dtype=np.int8), rows, p=[0.45, 0.1, 0.45])
+        df[f'{tc}_in_range'] = rng.random(rows) < 0.3
+    df['PUC_State'] = rng.integers(0, 2, rows).astype(np.int8)
+    df['Door_Status'] = rng.choice(np.array([-1, 0, 1], dtype=np.int8), rows, p=[0.05, 0.9, 0.05])
+    df['Stage 1 RPM'] = rng.choice([0, 3000, 4000, 4500], rows).astype(np.int16)
+    df['Stage 2 RPM'] = rng.choice([0, 4000, 4500], rows).astype(np.int16)
+    df['Diff_TC2_&_TC7'] = rng.choice([5.0, 10.0, 15.0], rows) + rng.normal(0, 3, rows) * (rng.random(rows) < 0.5)
+    df['TC_zigzag'] = zigzag_rows(df[[f'{tc}_trend' for tc in TREND_CHANNELS]].to_numpy())
+    return df
\ No newline at end of file
@@ -0,0 +1,79 @@
+# feature_engineering's broadcast band check against the per-channel comparisons it replaced
+import numpy as np
+import pandas as pd
+import pytest
+
+from ..preprocessing import _band_trends, feature_engineering, in_range_mask
+
+BANDS = {
+    'TC1': (-20, -15), 'TC2': (15, 25), 'TC3': (-96, -86), 'TC4': (-96, -86), 'TC6': (-30, -20),
+    'TC7': (15, 26), 'TC8': (40, 50), 'TC9': (-np.inf, 68), 'TC10': (-45, -35)
+}
+
+def telemetry(rows, seed, channels=tuple(BANDS)) -> pd.DataFrame:
+    # values around each band, on its edges, sentinels and missing readings
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Date/Time': pd.date_range('2025-01-01', periods=rows, freq='min')})
+    for tc in channels:
+        lower, upper = BANDS[tc]
+        lower = upper - 20 if np.isinf(lower) else lower
+        values = rng.uniform(lower - 10, upper + 10, rows).astype(np.float32)
+        special = rng.random(rows)
+        values[special < 0.05] = lower
+        values[(special >= 0.05) & (special < 0.1)] = upper
+        values[(special >= 0.1) & (special < 0.12)] = np.nan
+        values[(special >= 0.12) & (special < 0.14)] = -127
+        df[tc] = values
+    df['Setpoint'] = rng.choice([-80.0, -70.0], rows)
+    df['User Offset'] = rng.choice([0.0, 1.0], rows)
+    df['RTD'] = df['Setpoint'] + df['User Offset'] + rng.choice([-1.5, 1.5, 0.0, -3.0, 3.0, np.nan], rows)
+    return df
+
+def reference_bands(df: pd.DataFrame) -> pd.DataFrame:
+    # the per-channel columns as feature_engineering built them before the broadcast
+    out = pd.DataFrame(index=df.index)
+    for tc, (lower_bound, upper_bound) in BANDS.items():
+        if tc not in df.columns:
+            continue
+        out[f'{tc}_in_range'] = df[tc].between(lower_bound, upper_bound)
+        out[f'{tc}_trend'] = np.where(
+            out[f'{tc}_in_range'], 0, np.where(df[tc] > upper_bound, 1, -1)
+        ).astype(np.int8)
+    lower = df['Setpoint'] + df['User Offset'] - 1.5
+    upper = df['Setpoint'] + df['User Offset'] + 1.5
+    out['RTD_in_range'] = (df['RTD'] >= lower) & (df['RTD'] <= upper)
+    out['RTD_trend'] = np.where(out['RTD_in_range'], 0, np.where(df['RTD'] > upper, 1, -1)).astype(np.int8)
+    return out
+
+@pytest.mark.parametrize('channels', [tuple(BANDS), ('TC1', 'TC3', 'TC9', 'TC10'), ()])
+def test_feature_engineering_matches_per_channel_bands(channels):
+    df = telemetry(5000, seed=len(channels), channels=channels)
+    expected = reference_bands(df)
+
+    engineered, _ = feature_engineering(df.copy())
+
+    for col in expected.columns:
+        assert engineered[col].dtype == expected[col].dtype, col
+        np.testing.assert_array_equal(engineered[col].to_numpy(), expected[col].to_numpy(), err_msg=col)
+    channels = engineered.attrs['trend_channels']
+    in_range = np.stack([expected[f'{tc}_in_range'].to_numpy() for tc in channels])
+    np.testing.assert_array_equal(engineered['In_Range_Mask'].to_numpy(), in_range_mask(in_range))
+
+def test_band_trends_broadcasts_a_band_per_channel():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(-50, 50, (3, 1000))
+    values[:, ::7] = np.nan
+    lower = np.array([-10.0, -np.inf, 0.0])[:, None]
+    upper = np.array([10.0, 0.0, np.inf])[:, None]
+    trends = np.empty(values.shape, dtype=np.int8)
+    in_range = np.empty(values.shape, dtype=bool)
+
+    _band_trends(values, lower, upper, trends, in_range)
+
+    for channel in range(3):
+        column = pd.Series(values[channel])
+        expected = column.between(lower[channel, 0], upper[channel, 0]).to_numpy()
+        np.testing.assert_array_equal(in_range[channel], expected)
+        np.testing.assert_array_equal(
+            trends[channel], np.where(expected, 0, np.where(column > upper[channel, 0], 1, -1))
+        )
\ No newline at end of file
@@ -0,0 +1,133 @@
+# the compiled STP and TSX rule tables against the row-wise conditions they were written from
+import numpy as np
+import pandas as pd
+import pytest
+
+from ..labels import DEFAULT_FLAG, DOOR_IGNORED_FLAG
+from ..predictions import STP_PLAN
+from ..tsx_predictions import TSX_PLAN
+from ..rules import evaluate_rules, stage_gates
+from .frames import rule_frame
+
+def _shared(row):
+    # the predicates the old condition builders repeated in almost every condition
+    tc3_tc4 = np.nanmean([row['TC3'], row['TC4']]) if not np.isnan([row['TC3'], row['TC4']]).all() else np.nan
+    connected = tc3_tc4 != 0 and tc3_tc4 != -127 and tc3_tc4 != 127
+    rtd = row['RTD_in_range'] == False and row['RTD_trend'] > 0
+    rpm = (row['Stage 1 RPM'] + row['Stage 2 RPM']) / 2 != 0
+    return connected, rtd, rpm
+
+def _gun_shot_fan(row, rtd):
+    return rtd and row['TC7_trend'] > 0 and row['TC2_trend'] > 0 and row['Diff_TC2_&_TC7'] > 10
+
+def _second_stage(row, connected, rtd, tsx):
+    # the '&' binding tighter than '|' of the original expressions is kept in the issue rules
+    if tsx:
+        issue = rtd and row['TC10_trend'] < 0 and row['TC1_trend'] < 0
+        compression = rtd and row['TC10_trend'] < 0 and row['TC3_trend'] > 0 and row['TC4_trend'] > 0 and row['TC1_trend'] < 0
+    else:
+        issue = (rtd and connected and row['TC10_trend'] < 0) or row['TC6_trend'] > 0
+        compression = (rtd and connected and row['TC10_trend'] < 0 and row['TC3_trend'] > 0
+                       and row['TC4_trend'] > 0 and row['TC1_trend'] < 0)
+    return {
+        "2nd stage leak issue": (
+            rtd and connected and row['TC3_trend'] < 0 and row['TC4_trend'] > 0 and row['TC6_trend'] > 0
+            and row['TC10_trend'] < 0 and row['TC1_trend'] < 0 and abs(row['TC3'] - row['TC4']) > 5
+        ),
+        "2nd stage issue": issue,
+        "2nd stage compression issue": compression,
+        f"2nd stage compressor {'inverter' if tsx else 'start components'} issue": (
+            rtd and row['TC_zigzag'] == True and row['TC10_trend'] < 0 and row['TC1_trend'] < 0
+        ),
+        "2nd stage insulation issue (Armaflex)": (
+            rtd and connected and row['TC3_in_range'] == True and row['TC4_trend'] > 0
+            and row['TC1_in_range'] == True and row['TC10_in_range'] == True
+        ),
+    }
+
+def stp_conditions(row):
+    connected, rtd, _ = _shared(row)
+    gun_shot = {
+        "1st stage hot sump": row['TC8'] >= 69,
+        "2nd stage hot sump": row['TC9'] >= 69,
+        "Intermittent Fan Issue": _gun_shot_fan(row, rtd),
+    }
+    first_stage = {
+        "1st stage leak issue": (
+            connected and rtd and row['TC10_trend'] > 0 and row['TC1_trend'] > 0 and row['TC8_trend'] > 0
+        ),
+        "1st stage issue": (connected and rtd and row['TC10_trend'] > 0) or row['TC1_trend'] > 0,
+        "1st stage compression issue": (
+            (connected and rtd and row['TC10_trend'] > 0 and row['PUC_State'] == 1) or row['TC1_trend'] > 0
+        ),
+        "1st stage compressor start components issue": (
+            rtd and row['TC_zigzag'] == True and row['TC10_trend'] > 0 and row['TC1_trend'] > 0 and row['TC1'] >= 70
+        ),
+    }
+    return gun_shot, first_stage, _second_stage(row, connected, rtd, tsx=False)
+
+def tsx_conditions(row, tc1_mean, count):
+    connected, rtd, rpm = _shared(row)
+    gun_shot = {
+        "2nd stage hot sump": row['TC9'] >= 69,
+        "HSLC": rpm and row['Stage 1 RPM'] >= 4000 and row['Stage 2 RPM'] >= 4000,
+        "Intermittent Fan Issue": _gun_shot_fan(row, rtd),
+    }
+    first_stage = {
+        "1st stage leak issue": connected and rtd and row['TC10_trend'] > 0 and row['TC1'] > tc1_mean + 15 and rpm,
+        "1st stage compression issue": rtd and row['TC10_trend'] > 0 and rpm and count > 0,
+        "1st stage issue": rtd and row['TC10_trend'] > 0 and tc1_mean - 10 <= row['TC1'] <= tc1_mean + 10 and rpm,
+        "1st stage compressor inverter issue": (
+            rtd and row['TC_zigzag'] == True and row['TC10_trend'] > 0 and row['TC1_trend'] > 0 and row['TC1'] >= 70
+        ),
+    }
+    return gun_shot, first_stage, _second_stage(row, connected, rtd, tsx=True)
+
+def row_wise_flags(df, conditions, warming, cooling) -> list[str]:
+    # door events, then the first gun shot condition, then the first stage conditions that apply
+    flags = []
+    for row in df.to_dict('records'):
+        if row['Door_Status'] == -1:
+            flags.append(DOOR_IGNORED_FLAG)
+            continue
+        gun_shot, first_stage, second_stage = conditions(row)
+        stages = [gun_shot] + [first_stage] * warming + [second_stage] * cooling
+        matches = (label for stage in stages for label, condition in stage.items() if condition)
+        flags.append(next(matches, DEFAULT_FLAG))
+    return flags
+
+@pytest.mark.parametrize('tc10, warming, cooling', [(None, True, True), (-30, True, False), (-50, False, True), (-40, False, False)])
+@pytest.mark.parametrize('layout', ['STP', 'TSX'])
+def test_rules_match_the_row_wise_conditions(layout, tc10, warming, cooling):
+    df = rule_frame(8000, seed=len(layout), tc10=tc10)
+    if layout == 'STP':
+        plan, context, conditions = STP_PLAN, None, stp_conditions
+    else:
+        plan, context = TSX_PLAN, {'TC1 mean': float(df['TC1'].mean()), 'refrigeration failures': 2}
+        conditions = lambda row: tsx_conditions(row, context['TC1 mean'], context['refrigeration failures'])
+
+    assert stage_gates(plan, df, context) == {'first_stage': warming, 'second_stage': cooling}
+    flags = evaluate_rules(plan, df, context)
+
+    expected = row_wise_flags(df, conditions, warming, cooling)
+    np.testing.assert_array_equal(np.asarray(flags, dtype=object), np.array(expected, dtype=object))
+    assert len(set(expected)) >= 4 + 3 * warming + 3 * cooling
+
+def test_rules_treat_missing_columns_as_zero():
+    df = rule_frame(5000, seed=7).drop(columns=['PUC_State', 'Diff_TC2_&_TC7', 'TC8', 'TC8_trend'])
+    filled = df.assign(**{'PUC_State': 0, 'Diff_TC2_&_TC7': 0.0, 'TC8': 0.0, 'TC8_trend': 0})
+
+    flags = evaluate_rules(STP_PLAN, df)
+
+    np.testing.assert_array_equal(
+        np.asarray(flags, dtype=object), np.array(row_wise_flags(filled, stp_conditions, True, True), dtype=object)
+    )
+
+def test_given_gates_override_the_frames_own():
+    df = rule_frame(5000, seed=3, tc10=-40)
+
+    flags = evaluate_rules(STP_PLAN, df, gates={'first_stage': True, 'second_stage': False})
+
+    np.testing.assert_array_equal(
+        np.asarray(flags, dtype=object), np.array(row_wise_flags(df, stp_conditions, True, False), dtype=object)
+    )
\ No newline at end of file
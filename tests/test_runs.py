@@ -0,0 +1,119 @@
+# the vectorized zigzag and run-length kernels against the loops they replaced
+import numpy as np
+import pandas as pd
+import pytest
+
+from ..labels import DEFAULT_FLAG, DOOR_IGNORED_FLAG, ISSUE_DTYPE
+from ..predictions import flag_sustained, is_sustained, is_zigzag, run_lengths, zigzag_rows
+
+# the rules label every row, so no missing flags: the loop counted runs of those, the kernel doesn't
+LABELS = [DEFAULT_FLAG, DOOR_IGNORED_FLAG, "1st stage leak issue", "2nd stage issue", "HSLC"]
+
+def runs_of(values, rng, longest=250) -> np.ndarray:
+    # values repeated in runs of random lengths, many of them around the sustained windows
+    lengths = rng.integers(1, longest, size=len(values))
+    return np.repeat(np.asarray(values, dtype=object), lengths)
+
+def reference_runs(values, times=None):
+    starts, lengths, durations = [], [], []
+    for i, value in enumerate(values):
+        if i == 0 or value != values[i - 1]:
+            starts.append(i)
+            lengths.append(0)
+            durations.append([])
+        lengths[-1] += 1
+        if times is not None and not np.isnat(times[i]):
+            durations[-1].append(times[i])
+    durations = [max(stamps) - min(stamps) if stamps else np.timedelta64('NaT') for stamps in durations]
+    return starts, lengths, [values[start] for start in starts], durations
+
+def reference_flag_sustained(flags, min_consecutive):
+    labels = [False] * len(flags)
+    current_flag, count = None, 0
+    for i, val in enumerate(flags):
+        if val in (DEFAULT_FLAG, DOOR_IGNORED_FLAG):
+            current_flag, count = None, 0
+            continue
+        if val == current_flag:
+            count += 1
+        else:
+            current_flag, count = val, 1
+        if count >= min_consecutive:
+            for j in range(i - min_consecutive + 1, i + 1):
+                labels[j] = True
+    return labels
+
+def reference_is_sustained(df, condition, min_duration):
+    df = df.copy()
+    df['condition_met'] = condition
+    df['group'] = (df['condition_met'] != df['condition_met'].shift()).cumsum()
+    minutes = df[df['condition_met']].groupby('group')['Date/Time'].agg(lambda x: (x.max() - x.min()).total_seconds() / 60)
+    return bool((minutes > min_duration).any())
+
+@pytest.mark.parametrize('channels', [1, 2, 3, 10])
+def test_zigzag_rows_matches_is_zigzag(channels):
+    rng = np.random.default_rng(channels)
+    trends = rng.integers(-1, 2, size=(20000, channels), dtype=np.int8)
+    trends[::5] = 0
+    trends[1::11] = np.resize([1, -1], channels)
+
+    expected = np.array([is_zigzag(row) for row in trends], dtype=bool)
+
+    np.testing.assert_array_equal(zigzag_rows(trends), expected)
+    assert not expected.all() and (expected.any() or channels == 1)
+
+@pytest.mark.parametrize('seed', range(4))
+def test_run_lengths_matches_a_loop(seed):
+    rng = np.random.default_rng(seed)
+    values = runs_of(rng.integers(0, 3, 200), rng, longest=20).astype(np.int64)
+    times = pd.date_range('2025-01-01', periods=len(values), freq='min').to_numpy()
+    times = times[rng.permutation(len(times))]  # a run's span is max - min, not last - first
+    times[rng.random(len(times)) < 0.2] = np.datetime64('NaT')
+
+    runs = run_lengths(values, times)
+    starts, lengths, run_values, durations = reference_runs(values, times)
+
+    np.testing.assert_array_equal(runs.starts, starts)
+    np.testing.assert_array_equal(runs.lengths, lengths)
+    np.testing.assert_array_equal(runs.values, run_values)
+    np.testing.assert_array_equal(runs.durations, np.array(durations, dtype='timedelta64[ns]'))
+
+def test_run_lengths_of_nothing():
+    runs = run_lengths(np.array([], dtype=bool), np.array([], dtype='datetime64[ns]'))
+    assert len(runs.starts) == len(runs.lengths) == len(runs.values) == len(runs.durations) == 0
+
+@pytest.mark.parametrize('min_consecutive', [2, 45, 180])
+@pytest.mark.parametrize('categorical', [False, True])
+def test_flag_sustained_matches_the_loop(min_consecutive, categorical):
+    rng = np.random.default_rng(min_consecutive)
+    flags = runs_of(rng.choice(np.array(LABELS, dtype=object), 400), rng)
+    column = pd.Series(pd.Categorical(flags, dtype=ISSUE_DTYPE) if categorical else flags)
+
+    sustained = flag_sustained(pd.DataFrame({'Trend_Flag': column}), min_consecutive=min_consecutive)
+
+    expected = reference_flag_sustained(list(flags), min_consecutive)
+    np.testing.assert_array_equal(sustained, expected)
+    assert any(expected)
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('min_duration', [0, 45, 300])
+def test_is_sustained_matches_the_groupby(seed, min_duration):
+    rng = np.random.default_rng(seed)
+    rows = 5000
+    # a minute a row with gaps, so a run's rows and its minutes differ
+    steps = rng.choice([1, 1, 1, 2, 30], rows)
+    df = pd.DataFrame({'Date/Time': pd.Timestamp('2025-01-01') + pd.to_timedelta(np.cumsum(steps), unit='min')})
+    condition = pd.Series(runs_of(rng.random(100) < 0.5, rng, longest=120)[:rows].astype(bool))
+    if len(condition) < rows:
+        condition = condition.reindex(range(rows), fill_value=False)
+    condition[0] = True
+
+    assert is_sustained(df, condition, min_duration) == reference_is_sustained(df, condition, min_duration)
+    assert not is_sustained(df, pd.Series(False, index=df.index), min_duration)
+
+@pytest.mark.parametrize('span, expected', [(45, False), (46, True)])
+def test_is_sustained_needs_more_than_min_duration(span, expected):
+    df = pd.DataFrame({'Date/Time': pd.date_range('2025-01-01', periods=60, freq='min')})
+    condition = pd.Series(np.arange(60) <= span)  # rows 0..span, span minutes apart
+
+    assert is_sustained(df, condition, 45) == reference_is_sustained(df, condition, 45) == expected
\ No newline at end of file
@@ -0,0 +1,113 @@
+# rules evaluated in time shards against the one-pass evaluation, around the shard boundaries
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from .. import sharding
+from ..predictions import STP_PLAN, flag_sustained, sustained_window, zigzag_rows
+from ..tsx_predictions import TSX_PLAN
+from ..rules import evaluate_rules, plan_columns, stage_gates
+from .frames import TREND_CHANNELS, rule_frame
+
+TREND_COLS = [f'{tc}_trend' for tc in TREND_CHANNELS]
+
+def one_pass(plan, df, context=None):
+    zigzag = zigzag_rows(df[TREND_COLS].to_numpy())
+    flags = evaluate_rules(plan, df.assign(TC_zigzag=zigzag), context)
+    return zigzag, np.asarray(flags.codes), flag_sustained(pd.DataFrame({'Trend_Flag': flags}))
+
+def sharded(plan, df, shards, context=None, overlap=None):
+    # the shards flag_rows hands to the pool, evaluated in this process
+    window = sustained_window()
+    overlap = window - 1 if overlap is None else overlap
+    columns = [col for col in dict.fromkeys([*TREND_COLS, *plan_columns(plan)]) if col in df.columns]
+    handle, block = sharding.share_columns(df, columns)
+    try:
+        gates = stage_gates(plan, df, context)
+        results = [
+            sharding._evaluate_shard(handle, plan, TREND_COLS, context, gates, window, bounds)
+            for bounds in sharding.shard_bounds(len(df), shards, overlap)
+        ]
+    finally:
+        block.close()
+        block.unlink()
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+def hot_sump_runs(rows, runs) -> pd.DataFrame:
+    # nothing flagged but "2nd stage hot sump" on the (start, length) runs given
+    df = rule_frame(rows, seed=0, tc10=-40)
+    df['Door_Status'] = np.int8(0)
+    df['TC8'] = df['TC9'] = np.float32(20)
+    df['RTD_trend'] = np.int8(0)
+    for start, length in runs:
+        df.loc[start:start + length - 1, 'TC9'] = np.float32(75)
+    return df
+
+def blocky_frame(rows, seed, block=401) -> pd.DataFrame:
+    # every column constant over blocks of rows, so flag runs are long and cross the shard edges
+    df = rule_frame(rows, seed)
+    repeat = np.repeat(np.arange(0, rows, block), block)[:rows]
+    for col in df.columns.drop(['Date/Time', 'TC10']):
+        df[col] = df[col].to_numpy()[repeat]
+    return df
+
+def assert_same(expected, result):
+    for name, a, b in zip(('TC_zigzag', 'Trend_Flag', 'Sustained_Issue'), expected, result):
+        np.testing.assert_array_equal(b, a, err_msg=name)
+
+@pytest.mark.parametrize('before', [1, 90, 178, 179])
+@pytest.mark.parametrize('extra', [-1, 0, 1])
+def test_run_of_the_window_across_a_boundary(before, extra):
+    # a run of window + extra rows starting before rows ahead of the boundary between the shards
+    rows, shards = 3000, 3
+    window = sustained_window()
+    boundary = sharding.shard_bounds(rows, shards, window - 1)[1][0]
+    df = hot_sump_runs(rows, [(boundary - before, window + extra)])
+    expected = one_pass(STP_PLAN, df)
+    assert expected[2].any() == (extra >= 0)
+
+    assert_same(expected, sharded(STP_PLAN, df, shards))
+
+def test_an_overlap_short_of_the_window_breaks_a_run():
+    rows, shards = 3000, 3
+    window = sustained_window()
+    boundary = sharding.shard_bounds(rows, shards, window - 1)[1][0]
+    df = hot_sump_runs(rows, [(boundary - 179, window)])
+    expected = one_pass(STP_PLAN, df)
+
+    assert not np.array_equal(sharded(STP_PLAN, df, shards, overlap=window - 2)[2], expected[2])
+
+@pytest.mark.parametrize('shards', [2, 5, 16])
+@pytest.mark.parametrize('layout', ['STP', 'TSX'])
+def test_shards_match_one_pass(layout, shards):
+    df = blocky_frame(20011, seed=shards)
+    plan, context = STP_PLAN, None
+    if layout == 'TSX':
+        plan, context = TSX_PLAN, {'TC1 mean': float(df['TC1'].mean()), 'refrigeration failures': 2}
+    expected = one_pass(plan, df, context)
+    edges = [start for start, _, _, _ in sharding.shard_bounds(len(df), shards, sustained_window() - 1)[1:]]
+    assert any(expected[2][edge - 1] and expected[2][edge] for edge in edges)
+
+    assert_same(expected, sharded(plan, df, shards, context))
+
+@pytest.fixture
+def rule_pool(monkeypatch):
+    # the forkserver doesn't get the test's sys.path, so the workers find the package on PYTHONPATH
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    evaluated = []
+    evaluate_shards = sharding._evaluate_shards
+    monkeypatch.setattr(sharding, '_evaluate_shards', lambda *args: evaluated.append(evaluate_shards(*args)) or evaluated[-1])
+    sharding.set_rule_workers(3)
+    yield evaluated
+    sharding.set_rule_workers(None)
+
+def test_flag_rows_on_the_pool_matches_one_pass(rule_pool):
+    df = blocky_frame(20011, seed=1)
+    expected = one_pass(STP_PLAN, df)
+
+    flags, sustained = sharding.flag_rows(STP_PLAN, df, TREND_COLS, min_shard_rows=1000)
+
+    assert len(rule_pool) == 1 and rule_pool[0] is not None, "the shards didn't run on the pool"
+    assert_same(expected, (df['TC_zigzag'].to_numpy(), np.asarray(flags.codes), sustained))
\ No newline at end of file
@@ -0,0 +1,109 @@
+# wall time spans of the pipeline stages, returned as Server-Timing headers and
+# aggregated for the Prometheus /metrics endpoint
+import re
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+import numpy as np
+from flask import g, has_request_context
+
+QUANTILES = (0.5, 0.95, 0.99)
+# recent spans of a stage its quantiles are taken over
+DEFAULT_WINDOW = 1024
+
+@dataclass
+class Span:
+    stage: str
+    rows: int | None = None
+    seconds: float = 0.0
+
+class StageMetrics:
+    """Count, total seconds and rows of every stage, with quantiles over its last window spans."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, rows=None) -> None:
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = {
+                    'count': 0, 'seconds': 0.0, 'rows': 0, 'recent': deque(maxlen=self.window)
+                }
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['rows'] += rows or 0
+            stats['recent'].append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {stage: dict(stats, recent=list(stats['recent'])) for stage, stats in self._stages.items()}
+        for stats in stages.values():
+            recent = stats.pop('recent')
+            stats['quantiles'] = dict(zip(QUANTILES, np.quantile(recent, QUANTILES).tolist()))
+        return stages
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        stages = sorted(self.snapshot().items())
+        lines = [
+            "# HELP puc_stage_seconds Wall time of a pipeline stage.",
+            "# TYPE puc_stage_seconds summary",
+        ]
+        for stage, stats in stages:
+            for quantile, seconds in stats['quantiles'].items():
+                lines.append(f'puc_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {seconds:.6f}')
+            lines.append(f'puc_stage_seconds_sum{{stage="{stage}"}} {stats["seconds"]:.6f}')
+            lines.append(f'puc_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines += [
+            "# HELP puc_stage_rows_total Telemetry rows processed by a pipeline stage.",
+            "# TYPE puc_stage_rows_total counter",
+        ]
+        for stage, stats in stages:
+            lines.append(f'puc_stage_rows_total{{stage="{stage}"}} {stats["rows"]}')
+        return "\n".join(lines) + "\n"
+
+METRICS = StageMetrics()
+
+def current_spans() -> list[Span] | None:
+    # the spans of the current request, to hand to work it runs on other threads
+    if has_request_context():
+        return g.setdefault('spans', [])
+    return None
+
+def record(stage: str, seconds: float, rows=None, spans: list[Span] | None = None) -> Span:
+    """Account a measured stage to METRICS and to the Server-Timing spans of the (current) request."""
+    current = Span(stage, rows, seconds)
+    METRICS.observe(stage, seconds, rows)
+    if spans is None:
+        spans = current_spans()
+    if spans is not None:
+        spans.append(current)
+    return current
+
+@contextmanager
+def span(stage: str, rows=None, timings: dict | None = None, spans: list[Span] | None = None):
+    """
+    Time the block as stage (see record), also added to timings if given. Set rows on the
+    yielded Span when the row count is only known inside the block.
+    """
+    current = Span(stage, rows)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        seconds = time.perf_counter() - start
+        record(stage, seconds, current.rows, spans)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+def server_timing(spans: list[Span], total: float | None = None) -> str:
+    # metric names are tokens and durations are milliseconds
+    metrics = [f"{re.sub(r'[^A-Za-z0-9_-]', '_', s.stage)};dur={s.seconds * 1000:.1f}" for s in spans]
+    if total is not None:
+        metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
\ No newline at end of file
@@ -6,6 +6,8 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import io
 import base64
+
+from .preprocessing import column_profile
 alt.data_transformers.enable('vegafusion')  # Use data server for large datasets
 
 # Thermocouple label mapping
@@ -222,21 +224,23 @@ def get_absolute_df(df):
         data_source = df  # fallback to full data
         source_label = "Full Dataset (No Issues Detected)"
 
+    # the full data's stats come from its profile, the flagged period's are taken in one pass
+    profile = column_profile(data_source, column_to_absolute_df)
+
     # Loop through each column and collect stats
     for col in column_to_absolute_df:
         if col in data_source.columns:
-            min_val = data_source[col].min()
-            max_val = data_source[col].max()
-            mean_val = data_source[col].mean()
-            min_date = data_source.loc[data_source[col].idxmin(), 'Date/Time'].strftime('%d-%m-%Y %H:%M:%S')
-            max_date = data_source.loc[data_source[col].idxmax(), 'Date/Time'].strftime('%d-%m-%Y %H:%M:%S')
+            stats = profile[col]
+            min_date = pd.Timestamp(stats.argmin_time).strftime('%d-%m-%Y %H:%M:%S')
+            max_date = pd.Timestamp(stats.argmax_time).strftime('%d-%m-%Y %H:%M:%S')
 
+            # readings are float32, round so the table doesn't show float32 noise
             summary_absolute_df.append({
                 'Column': col,
-                'Min': min_val,
+                'Min': round(stats.min, 2),
                 'Min Date': min_date,
-                'Mean': mean_val,
-                'Max': max_val,
+                'Mean': round(stats.mean, 2),
+                'Max': round(stats.max, 2),
                 'Max Date': max_date
             })
 